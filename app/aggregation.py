@@ -1,88 +1,292 @@
+import asyncio
 import logging
 import hashlib
 import time
-import shutil
-import tempfile
 from typing import Dict, List, Optional
 from pathlib import Path
 import requests
-from app.extractors import extract_pdf_pdfplumber, extract_web_playwright
-from .cloudinary_client import upload_source
+import httpx
+from app.extractors import extract_pdf_pdfplumber, extract_web_playwright_async
 from app.core.config import settings
+from app.async_runtime import run_sync
+from app.http_client import stream
+from app.utils import group_attribute_keys, normalize_attribute_key
+from app.metrics import incr, stage_timer, track_request
+from app.replay import recorded, active as replay_active, mode as replay_mode, REPLAY
+from app.disk_cache import DiskCache, make_key
+from app.attribute_vocabulary import unify_with_vocabulary
+from app.source_store import rejects_content_type, sniff_kind, source_store
+from app.archival import archival_queue
+from app.source_scheduler import CoverageTracker, coverage_target, schedule_sources
+from app.fetch_scheduler import HostCoolingOff, fetch_scheduler
 logger = logging.getLogger("truth_engine")
 logger.setLevel(logging.INFO)
-MAX_SOURCES = 3
-MAX_SERP_CALLS = 1
+SERP_PARAMS = {"engine": "google", "num": 10}
+# Re-runs and duplicate rows reuse the previous search instead of paying for another one.
+serp_cache = DiskCache(
+    settings.serp_cache_path,
+    max_entries=settings.serp_cache_max_entries,
+    default_ttl=settings.serp_cache_ttl_seconds,
+)
 
 
 from app.sacred  import (
     generate_search_queries,
-    extract_from_web,
-    extract_from_pdf,
-    standardize_with_llm,
-    build_golden_record,
-    unify_attributes
+    extract_from_web_async,
+    extract_from_pdf_async,
+    standardize_batch_with_llm_async,
+    build_golden_record_async,
 )
 
+def normalize_query(query: str) -> str:
+    return " ".join((query or "").lower().split())
+
+
+def serp_cache_key(query: str) -> str:
+    return make_key("serp", normalize_query(query), SERP_PARAMS)
+
+
+@recorded("serp")
+def _search_serp(query: str) -> List[str]:
+    response = requests.get(
+        "https://serpapi.com/search",
+        params={**SERP_PARAMS, "q": query, "api_key": settings.serpapi_key},
+        timeout=20,
+    )
+    response.raise_for_status()
+    data = response.json()
+    if data.get("error") and not data.get("organic_results"):
+        # SerpAPI reports "no results" as an error too; only that case is a real empty result.
+        if "hasn't returned any results" not in data["error"]:
+            raise RuntimeError(data["error"])
+    urls = []
+    for r in data.get("organic_results", []):
+        link = r.get("link")
+        if link:
+            urls.append(link)
+    return urls[:5]
+
+
 def get_serp_urls(query: str) -> List[str]:
     if not settings.serpapi_key:
         logger.error("SerpAPI key is missing!")
         return []
+    query = normalize_query(query)
+    use_cache = settings.serp_cache_enabled and not replay_active()
+    key = serp_cache_key(query)
+    if use_cache:
+        cached = serp_cache.get(key)
+        if cached is not None:
+            incr("serp_cache_hits")
+            if not cached:
+                serp_cache.incr("negative_hits")
+            return cached
     try:
-        response = requests.get(
-            "https://serpapi.com/search",
-            params={
-                "engine": "google",
-                "q": query,
-                "api_key": settings.serpapi_key,
-                "num": 10,
-            },
-            timeout=20,
-        )
-        data = response.json()
-        urls = []
-        for r in data.get("organic_results", []):
-            link = r.get("link")
-            if link:
-                urls.append(link)
-        
-        return urls[:5] 
+        urls = _search_serp(query)
     except Exception as e:
+        # Failures are not cached; the next run searches again.
         logger.warning(f"SerpAPI failed for '{query}': {e}")
         return []
-def download_and_store(url: str, temp_dir: Path) -> Optional[Dict]:
+    incr("serp_calls")
+    if use_cache:
+        serp_cache.set(key, urls, ttl=None if urls else settings.serp_cache_negative_ttl_seconds)
+    return urls
+
+
+def serp_cache_stats() -> Dict:
+    return {
+        "enabled": settings.serp_cache_enabled,
+        "ttl_seconds": settings.serp_cache_ttl_seconds,
+        "negative_ttl_seconds": settings.serp_cache_negative_ttl_seconds,
+        **serp_cache.stats(),
+    }
+
+
+class UnusableSource(Exception):
+    """The URL answered, but with something that is not a spec source (wrong type, too large)."""
+
+
+@recorded("download")
+async def _fetch(url: str, headers: Optional[Dict] = None):
+    """Stream ``url`` into the source store, inside a politeness slot for its host.
+
+    Returns ``(status, kind, path, validators, rejected)``: ``kind`` is "pdf" or
+    "html" as sniffed from the first chunk, ``path`` the stored body, and
+    ``rejected`` the reason the body was abandoned part-way, if it was.
+    """
     try:
-        response = requests.get(
-            url,
-            headers={"User-Agent": "TruthEngine/1.0"},
-            timeout=40,
-            verify=False
-        )
-        if response.status_code != 200:
-            return None
-        content_hash = hashlib.sha256(response.content).hexdigest()[:16]
-        is_pdf = "pdf" in response.headers.get("Content-Type", "").lower()
-        ext = ".pdf" if is_pdf else ".html"
-        local_path = temp_dir / f"{content_hash}{ext}"
-        local_path.write_bytes(response.content)
-        upload_result = upload_source(response.content, content_hash)
-        if not upload_result:
-            return None
-        return {
-            "source_url": url,
-            "cloudinary_url": upload_result.get("secure_url"),
-            "local_path": str(local_path),
-            "type": "pdf" if is_pdf else "html",
+        async with fetch_scheduler.slot(url, "download", settings.http_timeout_seconds) as slot:
+            timeout = httpx.Timeout(slot.timeout, connect=min(slot.timeout, settings.http_connect_timeout_seconds))
+            async with stream(url, headers=headers, timeout=timeout) as response:
+                slot.report_status(response.status_code, response.headers.get("Retry-After"))
+                return await _store_body(response)
+    except HostCoolingOff as e:
+        return None, None, None, {}, str(e)
+
+
+async def _store_body(response: httpx.Response):
+    """Stream a response into the source store; same return shape as _fetch."""
+    max_bytes = int(settings.download_max_mb * 1024 * 1024)
+    if response.status_code != 200:
+        return response.status_code, None, None, {}, None
+    content_type = response.headers.get("Content-Type", "")
+    if rejects_content_type(content_type):
+        return 200, None, None, {}, f"content type {content_type}"
+    try:
+        declared = int(response.headers.get("Content-Length") or 0)
+    except ValueError:
+        declared = 0  # malformed header: the streaming cap below still applies
+    if declared > max_bytes:
+        return 200, None, None, {}, f"{declared} bytes"
+    validators = {name: response.headers[name] for name in ("etag", "last-modified") if name in response.headers}
+    digest = hashlib.sha256()
+    size, kind = 0, None
+    tmp = source_store.incoming()
+    try:
+        with open(tmp, "wb") as body:
+            async for chunk in response.aiter_bytes(settings.download_chunk_bytes):
+                if kind is None:
+                    kind = sniff_kind(chunk, content_type)
+                    if kind is None:
+                        return 200, None, None, {}, f"unrecognised body ({content_type or 'no content type'})"
+                size += len(chunk)
+                if size > max_bytes:
+                    return 200, None, None, {}, f"larger than {settings.download_max_mb} MB"
+                digest.update(chunk)
+                body.write(chunk)
+        if kind is None:
+            return 200, None, None, {}, "empty body"
+        path = source_store.path(source_store.commit(tmp, digest.hexdigest()[:16]))
+    finally:
+        tmp.unlink(missing_ok=True)
+    return 200, kind, path, validators, None
+
+
+async def _download(url: str) -> Optional[Dict]:
+    """Fetch ``url`` into the source store and archive it; unchanged bodies are served locally."""
+    # Record/replay runs must see every download, so they bypass the store's index.
+    use_store = not replay_active()
+    entry = await asyncio.to_thread(source_store.lookup, url) if use_store else None
+    if entry and source_store.is_fresh(entry):
+        incr("source_store_fresh")
+        return await _stored_source(url, entry)
+    status_code, kind, path, validators, rejected = await _fetch(
+        url, headers=source_store.conditional_headers(entry) or None
+    )
+    if rejected:
+        raise UnusableSource(rejected)
+    if status_code == 304 and entry:
+        incr("source_not_modified")
+    elif status_code == 200:
+        path = Path(path)
+        if path.parent != source_store.root:
+            # Replayed bodies come from the replay archive.
+            digest = await asyncio.to_thread(source_store.put_file, path)
+        else:
+            digest = path.name
+        if entry is None or entry["hash"] != digest:
+            entry = {"hash": digest}
+        entry = {
+            **entry,
+            "type": kind,
+            "etag": validators.get("etag"),
+            "last_modified": validators.get("last-modified"),
         }
+    else:
+        return None
+    src = await _stored_source(url, entry)
+    if use_store:
+        await asyncio.to_thread(source_store.save, url, entry)
+    return src
+
+
+async def _stored_source(url: str, entry: Dict) -> Dict:
+    local_path = source_store.path(entry["hash"])
+    # Archival runs in the background; extraction reads the local copy straight away.
+    # Until the drainer has a secure_url the record keeps pointing at the original URL.
+    archive_url = None
+    if replay_mode() != REPLAY:
+        archive_url = await asyncio.to_thread(archival_queue.enqueue, entry["hash"], str(local_path))
+    if replay_active():
+        # Recorded and replayed runs must produce the same record whatever the queue holds.
+        archive_url = None
+    return {
+        "source_url": url,
+        "cloudinary_url": archive_url,
+        "local_path": str(local_path),
+        "type": entry.get("type") or ("pdf" if "pdf" in (entry.get("content_type") or "").lower() else "html"),
+    }
+
+
+async def _acquire_source(url: str) -> Optional[Dict]:
+    with stage_timer("download"):
+        try:
+            src = await _download(url)
+        except UnusableSource as e:
+            # A browser would fetch the same thing (or hit the same cooling-off host);
+            # the Playwright fallback is only for blocked pages.
+            logger.info(f"Skipping {url}: {e}")
+            incr("sources_rejected")
+            return None
+        except Exception as e:
+            logger.warning(f"Download failed {url}: {e}")
+            src = None
+    if src:
+        return src
+
+    logger.info(f"Standard download failed for {url}, trying Playwright...")
+    with stage_timer("playwright"):
+        html_content = await extract_web_playwright_async(url)
+    if not html_content:
+        return None
+    digest = await asyncio.to_thread(source_store.put, html_content.encode("utf-8", errors="ignore"))
+    return {
+        "source_url": url,
+        "cloudinary_url": url,
+        "local_path": str(source_store.path(digest)),
+        "type": "html"
+    }
+
+
+def aggregate_product(mpn: str = None, upc: str = None, title: str = None, category: str = None) -> Dict:
+    return run_sync(aggregate_product_async(mpn=mpn, upc=upc, title=title, category=category))
+
+
+async def _extract_source(src: Dict) -> Optional[Dict]:
+    try:
+        with stage_timer("extraction"):
+            if src["type"] == "pdf":
+                raw_text = await asyncio.to_thread(extract_pdf_pdfplumber, src["local_path"])
+                data = await extract_from_pdf_async(raw_text)
+            else:
+                raw_html = Path(src["local_path"]).read_text(errors="ignore")
+                data = await extract_from_web_async(raw_html)
+        
+        data["source_url"] = src.get("cloudinary_url") or src.get("source_url")
+        return data
     except Exception as e:
-        logger.warning(f"Download failed {url}: {e}")
+        logger.warning(f"Extraction failed for {src['source_url']}: {e}")
         return None
 
 
-def aggregate_product(mpn: str = None, upc: str = None, title: str = None) -> Dict:
+async def aggregate_product_async(
+    mpn: str = None, upc: str = None, title: str = None, category: str = None
+) -> Dict:
     request_id = hashlib.sha256(f"{mpn}{title}{time.time()}".encode()).hexdigest()[:12]
     logger.info(f"[{request_id}] Aggregation started for {mpn or title}")
+    with track_request(request_id) as request_metrics:
+        result = await _aggregate(mpn, upc, title, category)
+    result["request_id"] = request_id
+    result["metrics"] = request_metrics.summary()
+    llm_usage = result["metrics"]["llm"]
+    logger.info(
+        f"[{request_id}] {llm_usage['call_count']} LLM calls, "
+        f"{llm_usage['prompt_tokens'] + llm_usage['completion_tokens']} tokens, ${llm_usage['cost_usd']}"
+    )
+    return result
+
 
+async def _aggregate(mpn: str, upc: str, title: str, category: Optional[str] = None) -> Dict:
     identifiers = {
         "mpn": mpn or "",
         "upc": upc or "",
@@ -90,88 +294,94 @@ def aggregate_product(mpn: str = None, upc: str = None, title: str = None) -> Di
         "brand": (title or "").split(maxsplit=1)[0] if title else "",
     }
 
-    with tempfile.TemporaryDirectory(prefix="truth_") as tmp:
-        temp_dir = Path(tmp)
-        queries = generate_search_queries(mpn, identifiers["brand"], title)
-        
-        if not queries:
-            queries = [f"{mpn} datasheet pdf", f"{title} specifications"]
-
-        urls: List[str] = []
-        for q in queries[:MAX_SERP_CALLS]:
-            urls.extend(get_serp_urls(q))
-            time.sleep(0.4)
-
-        seen = set()
-        sources = []
-        for url in urls:
-            if url in seen or len(sources) >= MAX_SOURCES:
-                continue
-            
-            src = download_and_store(url, temp_dir)
-            
-            if not src:
-                logger.info(f"Standard download failed for {url}, trying Playwright...")
-                html_content = extract_web_playwright(url)
-                
-                if html_content: 
-                    content_hash = hashlib.sha256(html_content.encode()).hexdigest()[:16]
-                    local_path = temp_dir / f"{content_hash}.html"
-                    local_path.write_text(html_content, errors="ignore")
-                    
-                    src = {
-                        "source_url": url,
-                        "cloudinary_url": url,
-                        "local_path": str(local_path),
-                        "type": "html"
-                    }
-                    sources.append(src)
-                    seen.add(url)
-            else:
-                sources.append(src)
-                seen.add(url)
-
-        extracted = []
-        for src in sources:
-            try:
-                if src["type"] == "pdf":
-                    raw_text = extract_pdf_pdfplumber(src["local_path"])
-                    data = extract_from_pdf(raw_text)
-                else:
-                    raw_html = Path(src["local_path"]).read_text(errors="ignore")
-                    data = extract_from_web(raw_html)
-                
-                data["source_url"] = src.get("cloudinary_url") or src.get("source_url")
-                extracted.append(data)
-            except Exception as e:
-                logger.warning(f"Extraction failed for {src['source_url']}: {e}")
-
-        if not extracted:
-            return {"status": "failed", "reason": "No specifications found across sources"}
-
-        keys = [k for e in extracted for k in e.get("attributes", {}).keys()]
-        unique_keys = list(set(keys)) 
-        mapping = unify_attributes(unique_keys)
-        
-        standardized = {}
-        canonical_map = mapping.get("canonical_attributes", {})
-        for canonical, info in canonical_map.items():
-            values = []
-            for e in extracted:
-                for syn in info.get("synonyms", []):
-                    if syn in e.get("attributes", {}):
-                        values.append(e["attributes"][syn])
-            
-            if values:
-                standardized[canonical] = standardize_with_llm(canonical, values)
-
-        golden = build_golden_record(standardized, identifiers)
+    with stage_timer("search_queries"):
+        queries = await asyncio.to_thread(generate_search_queries, mpn, identifiers["brand"], title)
+    
+    if not queries:
+        queries = [f"{mpn} datasheet pdf", f"{title} specifications"]
+
+    # Sources are fetched and extracted in rank order until the attributes found
+    # cover the category's target with enough confidence; a further search is only
+    # spent when the first one's results run out short of it.
+    tracker = CoverageTracker(coverage_target(category), settings.coverage_min_confidence)
+    candidates: List[str] = []
+    pairs = []
+    for q in queries[:settings.serp_max_calls]:
+        if pairs:
+            await asyncio.sleep(0.4)
+        with stage_timer("serp"):
+            urls = await asyncio.to_thread(get_serp_urls, q)
+        new_urls = [url for url in dict.fromkeys(urls) if url not in candidates]
+        candidates.extend(new_urls)
+        pairs.extend(await schedule_sources(
+            new_urls,
+            _acquire_source,
+            _extract_source,
+            tracker,
+            min_sources=settings.source_budget_min - len(pairs),
+            max_sources=settings.source_budget_max - len(pairs),
+            fetch_concurrency=settings.source_fetch_parallelism,
+            extract_concurrency=settings.source_extract_parallelism,
+        ))
+        if tracker.satisfied() or len(pairs) >= settings.source_budget_max:
+            break
+    pairs.sort(key=lambda pair: candidates.index(pair[0]["source_url"]))
+    extracted = [data for _, data in pairs]
+    coverage = tracker.summary()
+    logger.info(f"Coverage for {mpn or title} ({category or 'default'}): {coverage}")
+
+    if not extracted:
+        return {"status": "failed", "reason": "No specifications found across sources"}
+
+    keys = [k for e in extracted for k in e.get("attributes", {}).keys()]
+    # "Weight (lbs):", "weight, lb" and "WEIGHT [LB]" go to unification once; key_groups maps back to the raw keys.
+    # Keys whose unit hints differ ("Input (V)" / "Input (A)") stay in separate groups.
+    key_groups = group_attribute_keys(keys)
+    unique_keys = [variants[0] for variants in key_groups.values()]
+    logger.info(f"{len(keys)} raw attribute keys -> {len(unique_keys)} after normalization")
+    with stage_timer("unify"):
+        mapping = await unify_with_vocabulary(unique_keys)
+    
+    canonical_values = {}
+    provenance = {}
+    canonical_map = mapping.get("canonical_attributes", {})
+    for canonical, info in canonical_map.items():
+        values = []
+        support = []
+        raw_keys = list(dict.fromkeys(
+            raw
+            for syn in info.get("synonyms", [])
+            for raw in key_groups.get(normalize_attribute_key(syn), [syn])
+        ))
+        for e in extracted:
+            for syn in raw_keys:
+                if syn in e.get("attributes", {}):
+                    values.append(e["attributes"][syn])
+                    support.append({"source_url": e.get("source_url"), "source": e.get("source", "web")})
         
-        return {
-            "request_id": request_id,
-            "identifiers": identifiers,
-            "sources_used": len(sources),
-            "golden_record": golden,
-            "ready_for_publish": golden.get("ready_for_publish", False),
-            "status": "success",
-        }
\ No newline at end of file
+        if values:
+            canonical_values[canonical] = values
+            provenance[canonical] = support
+
+    with stage_timer("standardize"):
+        standardized = await standardize_batch_with_llm_async(canonical_values)
+
+    with stage_timer("golden_record"):
+        golden = await build_golden_record_async(standardized, identifiers, provenance)
+    
+    return {
+        "identifiers": identifiers,
+        "sources_used": len(extracted),
+        "coverage": coverage,
+        "sources": [
+            {
+                "source_url": e.get("source_url"),
+                "extraction_method": e.get("extraction_method", "llm"),
+                "attribute_count": len(e.get("attributes", {})),
+            }
+            for e in extracted
+        ],
+        "golden_record": golden,
+        "ready_for_publish": golden.get("ready_for_publish", False),
+        "status": "success",
+    }
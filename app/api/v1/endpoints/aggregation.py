@@ -4,9 +4,42 @@ from sqlmodel import select, func
 from app.core.database import get_session
 from app.models.product import Product
 from app.models.pipeline import RawExtraction
+from app.aggregation import serp_cache, serp_cache_stats
+from app.archival import archival_queue
+from app.fetch_scheduler import fetch_scheduler
+from app.worker_pool import get_worker_pool
 import logging
 logger = logging.getLogger("aggregation_router")
 router = APIRouter()
+
+
+@router.get("/serp-cache/stats")
+def get_serp_cache_stats():
+    return serp_cache_stats()
+
+
+@router.delete("/serp-cache")
+def clear_serp_cache():
+    serp_cache.clear()
+    logger.info("SERP cache cleared")
+    return {"msg": "SERP cache cleared"}
+
+
+@router.get("/archival/stats")
+def get_archival_stats():
+    return archival_queue.stats()
+
+
+@router.get("/hosts/stats")
+def get_host_stats():
+    return fetch_scheduler.stats()
+
+
+@router.get("/workers/stats")
+def get_worker_stats():
+    return get_worker_pool().stats()
+
+
 @router.get("/attributes/{product_id}")
 async def get_aggregated_attributes(product_id: str, db: AsyncSession = Depends(get_session)):
     try:
@@ -6,7 +6,8 @@ from app.core.database import get_session, async_session_factory
 from app.models.product import Product
 from typing import List
 import logging
-from app.aggregation import aggregate_product
+from app.aggregation import aggregate_product_async
+from app.async_runtime import run_on_runtime
 from app.schemas.extraction import ExtractionRequest, SourceMetricsResponse
 from app.schemas.pipeline import SourcePriorityResponse
 from app.utils import is_invalid
@@ -41,7 +42,7 @@ async def run_extraction_task(source_id: str, content: str):
             sku = extracted_keys.get('sku') or extracted_keys.get('mpn')
             title = extracted_keys.get('product_name') or extracted_keys.get('brand')
 
-            result = aggregate_product(mpn=sku, title=title)
+            result = await run_on_runtime(aggregate_product_async(mpn=sku, title=title))
             
             if result.get('status') == 'success' and sku:
                 ai_data = result.get('golden_record', {}).get('attributes', {})
@@ -0,0 +1,43 @@
+from fastapi import APIRouter
+import logging
+from app.llm_hedging import hedging_stats
+from app.metrics import metrics_snapshot
+from app.llm import cache_stats, response_cache, single_flight_stats, provider_status
+logger = logging.getLogger("llm_router")
+router = APIRouter()
+
+
+@router.get("/status")
+def get_provider_status():
+    providers = provider_status()
+    return {
+        "healthy": any(p["state"] != "open" for p in providers.values()),
+        "providers": providers,
+    }
+
+
+@router.get("/cache/stats")
+def get_cache_stats():
+    return cache_stats()
+
+
+@router.delete("/cache")
+def clear_cache():
+    response_cache.clear()
+    logger.info("LLM response cache cleared")
+    return {"msg": "LLM response cache cleared"}
+
+
+@router.get("/single-flight/stats")
+def get_single_flight_stats():
+    return single_flight_stats()
+
+
+@router.get("/hedging/stats")
+def get_hedging_stats():
+    return hedging_stats()
+
+
+@router.get("/metrics")
+def get_metrics():
+    return metrics_snapshot()
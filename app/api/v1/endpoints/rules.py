@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 from app.core.database import get_session
-from app.models.pipeline import BusinessRule 
+from app.models.pipeline import BusinessRule, AttributeSynonym
+from app.attribute_vocabulary import vocabulary
 from typing import Dict
 import logging
 logger = logging.getLogger("rules")
@@ -43,4 +44,21 @@ async def get_rules(db: AsyncSession = Depends(get_session)):
         return result.scalars().all()
     except Exception as e:
         logger.error(f"Failed to fetch rules: {e}")
-        return []
\ No newline at end of file
+        return []
+
+
+@router.get("/vocabulary")
+async def get_vocabulary(db: AsyncSession = Depends(get_session)):
+    try:
+        statement = select(AttributeSynonym).order_by(AttributeSynonym.canonical_name)
+        result = await db.execute(statement)
+        return result.scalars().all()
+    except Exception as e:
+        logger.error(f"Failed to fetch attribute vocabulary: {e}")
+        return []
+
+
+@router.get("/vocabulary/stats")
+async def get_vocabulary_stats():
+    await vocabulary.refresh()
+    return vocabulary.stats()
@@ -0,0 +1,230 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.metrics import incr
+
+logger = logging.getLogger("aggregation_engine")
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class CloudinaryUploader:
+    def upload(self, content: bytes, public_id: str) -> Optional[Dict]:
+        from app.cloudinary_client import upload_source
+        return upload_source(content, public_id)
+
+
+class LocalArchiveUploader:
+    """Copies sources into a local directory; stands in for Cloudinary in tests and offline runs."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def url_for(self, public_id: str) -> str:
+        return (self.root / public_id).resolve().as_uri()
+
+    def upload(self, content: bytes, public_id: str) -> Optional[Dict]:
+        path = self.root / public_id
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        return {"secure_url": self.url_for(public_id), "public_id": public_id}
+
+
+def _default_uploader():
+    if settings.archival_backend == "local":
+        return LocalArchiveUploader(settings.archival_local_path)
+    return CloudinaryUploader()
+
+
+class ArchivalQueue:
+    """SQLite-backed queue of source uploads, shared by every process that opens the same path.
+
+    Jobs are keyed by public_id (the content hash), so a body that is already
+    queued or archived is never uploaded twice. A drainer thread claims due
+    jobs in batches, uploads them concurrently and retries failures with
+    exponential backoff until archival_max_attempts.
+    """
+
+    def __init__(self, path: str, uploader=None):
+        self.path = Path(path)
+        self.uploader = uploader or _default_uploader()
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " public_id TEXT PRIMARY KEY,"
+                " local_path TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_attempt_at REAL NOT NULL,"
+                " secure_url TEXT,"
+                " error TEXT,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs(status, next_attempt_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, public_id: str, local_path: str) -> Optional[str]:
+        """Queue ``local_path`` for upload unless ``public_id`` is already known.
+
+        Returns the archive URL if the body has already been uploaded, else None.
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO jobs(public_id, local_path, status, next_attempt_at, created_at, updated_at) "
+                "VALUES(?, ?, ?, ?, ?, ?)",
+                (public_id, local_path, PENDING, now, now, now),
+            ).rowcount
+            row = conn.execute("SELECT status, secure_url FROM jobs WHERE public_id = ?", (public_id,)).fetchone()
+            if row and row[0] == FAILED:
+                # A fresh request for a source that exhausted its retries gets another round.
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = 0, next_attempt_at = ?, local_path = ?, updated_at = ? "
+                    "WHERE public_id = ?",
+                    (PENDING, now, local_path, now, public_id),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Archival enqueue failed for {public_id}: {e}")
+            return None
+        incr("archival_queued" if inserted else "archival_deduplicated")
+        return row[1] if row and row[0] == DONE else None
+
+    def _claim(self, limit: int) -> List[tuple]:
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs left running by a crashed drainer become due again after the lease.
+            rows = conn.execute(
+                "SELECT public_id, local_path, attempts FROM jobs "
+                "WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND updated_at <= ?) "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (PENDING, now, RUNNING, now - settings.archival_lease_seconds, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE public_id = ?",
+                [(RUNNING, now, row[0]) for row in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _upload(self, job: tuple) -> Optional[str]:
+        public_id, local_path, _ = job
+        result = self.uploader.upload(Path(local_path).read_bytes(), public_id)
+        if not result or not result.get("secure_url"):
+            raise RuntimeError("upload returned no URL")
+        return result["secure_url"]
+
+    def _finish(self, job: tuple, secure_url: Optional[str], error: Optional[Exception]):
+        public_id, _, attempts = job
+        now = time.time()
+        conn = self._connect()
+        if error is None:
+            conn.execute(
+                "UPDATE jobs SET status = ?, secure_url = ?, error = NULL, attempts = ?, updated_at = ? "
+                "WHERE public_id = ?",
+                (DONE, secure_url, attempts + 1, now, public_id),
+            )
+            return
+        attempts += 1
+        if attempts >= settings.archival_max_attempts:
+            logger.error(f"Archival of {public_id} failed after {attempts} attempts: {error}")
+            status, next_attempt_at = FAILED, now
+        else:
+            delay = min(settings.archival_backoff_seconds * 2 ** (attempts - 1), settings.archival_max_backoff_seconds)
+            logger.warning(f"Archival of {public_id} failed (attempt {attempts}), retrying in {delay:.1f}s: {error}")
+            status, next_attempt_at = PENDING, now + delay
+        conn.execute(
+            "UPDATE jobs SET status = ?, attempts = ?, next_attempt_at = ?, error = ?, updated_at = ? "
+            "WHERE public_id = ?",
+            (status, attempts, next_attempt_at, str(error)[:500], now, public_id),
+        )
+
+    def drain_once(self, executor: Optional[ThreadPoolExecutor] = None) -> int:
+        """Upload one batch of due jobs; returns how many were claimed."""
+        jobs = self._claim(settings.archival_batch_size)
+        if not jobs:
+            return 0
+
+        def run(job):
+            try:
+                self._finish(job, self._upload(job), None)
+            except Exception as e:
+                self._finish(job, None, e)
+
+        if executor is None:
+            for job in jobs:
+                run(job)
+        else:
+            list(executor.map(run, jobs))
+        return len(jobs)
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=settings.archival_concurrency, thread_name_prefix="archival") as executor:
+            while not self._stop.is_set():
+                try:
+                    claimed = self.drain_once(executor)
+                except Exception as e:
+                    logger.warning(f"Archival drainer error: {e}")
+                    claimed = 0
+                if not claimed:
+                    self._stop.wait(settings.archival_poll_seconds)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="archival-drainer", daemon=True)
+        self._thread.start()
+        logger.info(f"Archival drainer started ({self.path})")
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> Dict:
+        conn = self._connect()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        (retrying,) = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND attempts > 0", (PENDING,)
+        ).fetchone()
+        return {
+            "path": str(self.path),
+            "backend": type(self.uploader).__name__,
+            "drainer_running": self._thread is not None and self._thread.is_alive(),
+            **{status: counts.get(status, 0) for status in (PENDING, RUNNING, DONE, FAILED)},
+            "retrying": retrying,
+        }
+
+
+archival_queue = ArchivalQueue(settings.archival_queue_path)
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Optional
+
+logger = logging.getLogger(__name__)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _start_loop() -> asyncio.AbstractEventLoop:
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        loop.run_forever()
+
+    threading.Thread(target=run, name="async-runtime", daemon=True).start()
+    ready.wait()
+    return loop
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return this process's long-lived background event loop, starting it if needed.
+
+    Sync code (the pipeline, ProcessPool workers, FastAPI sync handlers) can hand
+    coroutines to this loop without caring whether an event loop is already
+    running in the calling thread. Clients, semaphores and pools created on it
+    stay valid across calls.
+    """
+    global _loop, _loop_pid
+    with _lock:
+        if _loop is None or _loop_pid != os.getpid() or _loop.is_closed():
+            _loop = _start_loop()
+            _loop_pid = os.getpid()
+        return _loop
+
+
+def run_sync(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    loop = get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_sync() called from inside the async runtime loop; await the coroutine instead")
+    future = asyncio.run_coroutine_threadsafe(coro, loop)
+    return future.result(timeout=timeout)
+
+
+async def run_on_runtime(coro: Awaitable[Any]) -> Any:
+    """Await ``coro`` on the runtime loop from a different event loop (e.g. a FastAPI handler)."""
+    loop = get_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
@@ -0,0 +1,163 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from sqlmodel import select
+
+from app.core.config import settings
+from app.metrics import counter, incr
+from app.models.pipeline import AttributeSynonym
+from app.replay import active as replay_active
+from app.sacred import unify_attributes_async
+from app.utils import coerce_confidence, normalize_attribute_key
+
+logger = logging.getLogger("aggregation_engine")
+
+_session_factory = None
+
+
+def _sessions():
+    # The pipeline runs on the background runtime loop (and in worker processes), where
+    # connections pooled by the request-serving engine cannot be reused; open one per use.
+    global _session_factory
+    if _session_factory is None:
+        engine = create_async_engine(settings.DATABASE_URL, poolclass=NullPool)
+        _session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    return _session_factory
+
+
+class AttributeVocabulary:
+    """Synonym -> canonical attribute registry backed by the attribute_synonyms table.
+
+    Entries are learned from unify_attributes results and reloaded every
+    vocabulary_refresh_seconds so names learned by other workers are picked
+    up. Without a database the registry stays empty and every name goes to
+    the LLM as before.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+        self._loaded_at = 0.0
+        self.db_available = None
+
+    async def refresh(self, force: bool = False):
+        if not force and self._loaded_at and time.monotonic() - self._loaded_at < settings.vocabulary_refresh_seconds:
+            return
+        self._loaded_at = time.monotonic()
+        try:
+            async with _sessions()() as session:
+                rows = (await session.execute(select(AttributeSynonym))).scalars().all()
+        except Exception as e:
+            self.db_available = False
+            logger.warning(f"Attribute vocabulary unavailable, unifying all names with the LLM: {e}")
+            return
+        with self._lock:
+            self._entries.update({row.normalized_name: (row.canonical_name, row.confidence) for row in rows})
+        self.db_available = True
+
+    def resolve(self, names: List[str]) -> Tuple[Dict[str, Tuple[str, float]], List[str]]:
+        """Split names into known ({name: (canonical, confidence)}) and unknown."""
+        known, unknown = {}, []
+        with self._lock:
+            for name in names:
+                entry = self._entries.get(normalize_attribute_key(name))
+                if entry:
+                    known[name] = entry
+                else:
+                    unknown.append(name)
+        incr("vocabulary_hits", len(known))
+        incr("vocabulary_misses", len(unknown))
+        return known, unknown
+
+    async def learn(self, unify_result: Dict, names: List[str]) -> int:
+        """Store confident groupings from a unify_attributes result for the names that were sent."""
+        sent = {normalize_attribute_key(name): name for name in names}
+        learned = {}
+        with self._lock:
+            for canonical, info in (unify_result.get("canonical_attributes") or {}).items():
+                if not isinstance(info, dict):
+                    continue
+                confidence = coerce_confidence(info.get("confidence"))
+                if confidence < settings.vocabulary_min_confidence:
+                    continue
+                for synonym in info.get("synonyms", []):
+                    key = normalize_attribute_key(synonym)
+                    if key in sent and key not in self._entries and key not in learned:
+                        learned[key] = (sent[key], canonical, confidence)
+            for key, (_, canonical, confidence) in learned.items():
+                self._entries[key] = (canonical, confidence)
+        if not learned:
+            return 0
+        incr("vocabulary_learned", len(learned))
+        if self.db_available is False:
+            return len(learned)
+        try:
+            async with _sessions()() as session:
+                statement = select(AttributeSynonym.normalized_name).where(
+                    AttributeSynonym.normalized_name.in_(list(learned))
+                )
+                existing = set((await session.execute(statement)).scalars().all())
+                for key, (raw, canonical, confidence) in learned.items():
+                    if key not in existing:
+                        session.add(AttributeSynonym(
+                            normalized_name=key, raw_name=raw, canonical_name=canonical, confidence=confidence
+                        ))
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Could not persist {len(learned)} learned attribute synonyms: {e}")
+        return len(learned)
+
+    def stats(self) -> Dict:
+        hits, misses = counter("vocabulary_hits"), counter("vocabulary_misses")
+        lookups = hits + misses
+        with self._lock:
+            entries = len(self._entries)
+        return {
+            "enabled": settings.vocabulary_enabled,
+            "db_available": self.db_available,
+            "entries": entries,
+            "lookups": lookups,
+            "hits": hits,
+            "misses": misses,
+            "learned": counter("vocabulary_learned"),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+vocabulary = AttributeVocabulary()
+
+
+def _merge_known(mapping: Dict, known: Dict[str, Tuple[str, float]]) -> Dict:
+    canonical_map = dict(mapping.get("canonical_attributes") or {})
+    for name, (canonical, confidence) in known.items():
+        info = canonical_map.get(canonical)
+        if info is None:
+            info = canonical_map[canonical] = {"synonyms": [], "confidence": confidence}
+        else:
+            info = canonical_map[canonical] = {**info, "synonyms": list(info.get("synonyms", []))}
+        info["synonyms"].append(name)
+    return {**mapping, "canonical_attributes": canonical_map}
+
+
+async def unify_with_vocabulary(names: List[str]) -> Dict:
+    """unify_attributes for ``names``, asking the LLM only about names the vocabulary does not know."""
+    # Record/replay runs must send the same names upstream every time, so the
+    # vocabulary is neither consulted nor taught while either mode is active.
+    if not settings.vocabulary_enabled or replay_active():
+        return await unify_attributes_async(names)
+    await vocabulary.refresh()
+    known, unknown = vocabulary.resolve(names)
+    mapping = {"canonical_attributes": {}}
+    if unknown:
+        mapping = await unify_attributes_async(unknown)
+        if isinstance(mapping, dict) and "error" not in mapping:
+            await vocabulary.learn(mapping, unknown)
+        elif not isinstance(mapping, dict):
+            mapping = {"canonical_attributes": {}}
+    logger.info(f"Attribute vocabulary resolved {len(known)}/{len(names)} names locally")
+    return _merge_known(mapping, known)
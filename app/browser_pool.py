@@ -0,0 +1,266 @@
+import asyncio
+import logging
+import os
+import weakref
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+
+logger = logging.getLogger("aggregation_engine")
+
+USER_AGENT = "Mozilla/5.0 (compatible; DataAggregationBot/1.0)"
+
+# Lean mode: resource types that never carry specs, and analytics/ad hosts.
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet", "texttrack", "manifest", "eventsource", "websocket"}
+TRACKER_DOMAINS = (
+    "google-analytics.com", "googletagmanager.com", "googlesyndication.com", "doubleclick.net",
+    "googleadservices.com", "facebook.net", "connect.facebook.com", "hotjar.com", "clarity.ms",
+    "segment.io", "segment.com", "optimizely.com", "newrelic.com", "nr-data.net", "criteo.com",
+    "criteo.net", "taboola.com", "outbrain.com", "adsrvr.org", "scorecardresearch.com",
+    "quantserve.com", "amazon-adsystem.com", "bat.bing.com", "analytics.tiktok.com", "cdn.cookielaw.org",
+)
+# Elements whose presence means the spec content has rendered. Bare tables and a bare
+# "spec" substring are left out: layout tables and names like "special", "inspect" or
+# "spectrum" are there right after DOMContentLoaded. "specs", "specification" and
+# "tech-spec" only occur in spec containers ("product-specs__row", "specifications").
+SPEC_NAME_FRAGMENTS = ("specs", "specification", "tech-spec", "techspec")
+SPEC_READY_SELECTOR = ", ".join(
+    [f"[{attr}*='{fragment}' i]" for fragment in SPEC_NAME_FRAGMENTS for attr in ("id", "class")]
+    + [
+        "[id='spec' i]", "[class~='spec' i]", "[itemprop='additionalProperty']", "dl dt",
+        "table[id*='tech' i] td", "table[class*='tech' i] td",
+    ]
+)
+
+
+def _is_tracker(url: str) -> bool:
+    host = urlsplit(url).hostname or ""
+    return any(host == domain or host.endswith("." + domain) for domain in TRACKER_DOMAINS)
+
+
+def _children_rss_mb() -> float:
+    """Resident memory of this process's descendants (the Playwright driver and Chromium), from /proc."""
+    try:
+        parents: Dict[int, int] = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # The command name may contain spaces; ppid is the 2nd field after it.
+                    parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+    except OSError:
+        return 0.0
+    descendants, frontier = set(), {os.getpid()}
+    while frontier:
+        frontier = {pid for pid, ppid in parents.items() if ppid in frontier and pid not in descendants}
+        descendants |= frontier
+    total_kb = 0
+    for pid in descendants:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+class _Browser:
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages_served = 0
+        self.active = 0
+        self.retired = False
+
+
+class BrowserPool:
+    """Long-lived Chromium shared by at most ``size`` concurrent isolated contexts.
+
+    The browser is recycled after ``recycle_pages`` pages, or once Chromium's
+    memory passes ``memory_limit_mb``. A retired browser finishes its open
+    pages before it is closed, so renders never wait for a restart.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        recycle_pages: int,
+        memory_limit_mb: float,
+        page_timeout_ms: int,
+        lean: bool = False,
+        ready_timeout_ms: int = 5000,
+    ):
+        self.size = size
+        self.recycle_pages = recycle_pages
+        self.memory_limit_mb = memory_limit_mb
+        self.page_timeout_ms = page_timeout_ms
+        self.lean = lean
+        self.ready_timeout_ms = ready_timeout_ms
+        self.blocked_requests = 0
+        self._slots = asyncio.Semaphore(size)
+        self._launch_lock = asyncio.Lock()
+        self._playwright = None
+        self._current: Optional[_Browser] = None
+        self.launches = 0
+        self.pages_rendered = 0
+
+    async def _launch(self) -> _Browser:
+        if self._playwright is None:
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+        browser = await self._playwright.chromium.launch(headless=True)
+        self.launches += 1
+        logger.info(f"Browser pool: launched Chromium #{self.launches}")
+        return _Browser(browser)
+
+    def _needs_recycle(self, entry: _Browser) -> bool:
+        if not entry.browser.is_connected():
+            return True
+        if self.recycle_pages and entry.pages_served >= self.recycle_pages:
+            return True
+        # Reading /proc for every page is wasteful; sample every 10 pages.
+        if self.memory_limit_mb and entry.pages_served and entry.pages_served % 10 == 0:
+            rss = _children_rss_mb()
+            if rss > self.memory_limit_mb:
+                logger.info(f"Browser pool: {rss:.0f} MB in use, recycling Chromium")
+                return True
+        return False
+
+    async def _browser(self) -> _Browser:
+        async with self._launch_lock:
+            current = self._current
+            if current is None or self._needs_recycle(current):
+                if current is not None:
+                    current.retired = True
+                    if current.active == 0:
+                        await self._close_browser(current)
+                current = self._current = await self._launch()
+            return current
+
+    async def _close_browser(self, entry: _Browser):
+        try:
+            await entry.browser.close()
+        except Exception as e:
+            logger.warning(f"Browser pool: closing Chromium failed: {e}")
+
+    async def acquire(self):
+        """Take a slot and return ``(entry, context)``; pair with release()."""
+        await self._slots.acquire()
+        try:
+            entry = await self._browser()
+            entry.active += 1
+            entry.pages_served += 1
+            try:
+                context = await entry.browser.new_context(user_agent=USER_AGENT)
+            except Exception:
+                entry.active -= 1
+                raise
+            context.set_default_timeout(self.page_timeout_ms)
+            context.set_default_navigation_timeout(self.page_timeout_ms)
+            if self.lean:
+                await context.route("**/*", self._lean_route)
+            return entry, context
+        except Exception:
+            self._slots.release()
+            raise
+
+    async def release(self, entry: _Browser, context):
+        try:
+            await context.close()
+        except Exception as e:
+            logger.warning(f"Browser pool: closing context failed: {e}")
+        finally:
+            entry.active -= 1
+            self.pages_rendered += 1
+            if entry.retired and entry.active == 0:
+                await self._close_browser(entry)
+            self._slots.release()
+
+    @asynccontextmanager
+    async def page(self):
+        entry, context = await self.acquire()
+        try:
+            yield await context.new_page()
+        finally:
+            await self.release(entry, context)
+
+    async def _lean_route(self, route):
+        request = route.request
+        if request.resource_type in BLOCKED_RESOURCE_TYPES or _is_tracker(request.url):
+            self.blocked_requests += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _wait_until_ready(self, page):
+        """Return once the network is idle or spec markup is present, whichever comes first, capped."""
+        waits = [
+            asyncio.ensure_future(page.wait_for_load_state("networkidle", timeout=self.ready_timeout_ms)),
+            asyncio.ensure_future(
+                page.wait_for_selector(SPEC_READY_SELECTOR, state="attached", timeout=self.ready_timeout_ms)
+            ),
+        ]
+        try:
+            await asyncio.wait(waits, timeout=self.ready_timeout_ms / 1000, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for wait in waits:
+                wait.cancel()
+            # Collect the outcome of the losing/timed-out waits so they are not reported as unretrieved.
+            await asyncio.gather(*waits, return_exceptions=True)
+
+    async def render(self, url: str, timeout_ms: Optional[int] = None) -> str:
+        timeout_ms = timeout_ms or self.page_timeout_ms
+        async with self.page() as page:
+            await page.goto(url, timeout=timeout_ms, wait_until="domcontentloaded")
+            if self.lean:
+                await self._wait_until_ready(page)
+            else:
+                await page.wait_for_timeout(2000)
+            return await page.content()
+
+    async def close(self):
+        async with self._launch_lock:
+            if self._current is not None:
+                await self._close_browser(self._current)
+                self._current = None
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+    def stats(self) -> Dict:
+        current = self._current
+        return {
+            "size": self.size,
+            "launches": self.launches,
+            "pages_rendered": self.pages_rendered,
+            "current_browser_pages": current.pages_served if current else 0,
+            "active_pages": current.active if current else 0,
+            "lean": self.lean,
+            "blocked_requests": self.blocked_requests,
+        }
+
+
+_pools = weakref.WeakKeyDictionary()
+
+
+def get_browser_pool() -> BrowserPool:
+    """The pool for the running event loop (normally the async runtime loop)."""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = _pools[loop] = BrowserPool(
+            size=settings.browser_pool_size,
+            recycle_pages=settings.browser_recycle_pages,
+            memory_limit_mb=settings.browser_memory_limit_mb,
+            page_timeout_ms=settings.browser_page_timeout_ms,
+            lean=settings.browser_lean_mode,
+            ready_timeout_ms=settings.browser_ready_timeout_ms,
+        )
+    return pool
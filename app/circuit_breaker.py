@@ -0,0 +1,224 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker for one upstream provider, shared across processes through a SQLite file.
+
+    closed    -> calls flow; outcomes are kept for ``window_seconds``. Once at
+                 least ``min_calls`` are recorded and the failure rate reaches
+                 ``failure_rate_threshold`` the breaker opens.
+    open      -> calls are refused until ``cooldown_seconds`` have passed.
+    half_open -> a single probe call is let through; success closes the
+                 breaker, failure re-opens it for another cooldown. The probe
+                 holds a lease of ``probe_lease_seconds``: a probe that never
+                 reports back (its worker died, its call was abandoned) stops
+                 blocking the breaker once the lease runs out.
+
+    Worker processes and the API process open the same file, so every
+    process trips and recovers together and the status endpoint sees all
+    traffic. If the file is unusable the breaker fails open.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: str,
+        failure_rate_threshold: float = 0.5,
+        window_seconds: float = 60.0,
+        min_calls: int = 4,
+        cooldown_seconds: float = 30.0,
+        probe_lease_seconds: float = 120.0,
+    ):
+        self.name = name
+        self.path = Path(path)
+        self.failure_rate_threshold = failure_rate_threshold
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.cooldown_seconds = cooldown_seconds
+        self.probe_lease_seconds = probe_lease_seconds
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS breakers ("
+                " name TEXT PRIMARY KEY,"
+                " state TEXT NOT NULL,"
+                " opened_at REAL NOT NULL DEFAULT 0,"
+                " probe_until REAL NOT NULL DEFAULT 0,"
+                " times_opened INTEGER NOT NULL DEFAULT 0,"
+                " total_successes INTEGER NOT NULL DEFAULT 0,"
+                " total_failures INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS outcomes (name TEXT NOT NULL, at REAL NOT NULL, ok INTEGER NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outcomes_name_at ON outcomes(name, at)")
+            conn.execute("INSERT OR IGNORE INTO breakers(name, state) VALUES(?, ?)", (name, CLOSED))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _load(self, conn: sqlite3.Connection, now: float):
+        """Current (state, opened_at, probe_until), moving an expired open breaker to half-open."""
+        state, opened_at, probe_until = conn.execute(
+            "SELECT state, opened_at, probe_until FROM breakers WHERE name = ?", (self.name,)
+        ).fetchone()
+        if state == OPEN and now - opened_at >= self.cooldown_seconds:
+            state, probe_until = HALF_OPEN, 0.0
+            conn.execute(
+                "UPDATE breakers SET state = ?, probe_until = 0 WHERE name = ?", (HALF_OPEN, self.name)
+            )
+        return state, opened_at, probe_until
+
+    def _transaction(self, body, default):
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = body(conn, now)
+                conn.execute("COMMIT")
+                return result
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Circuit breaker {self.name} unavailable: {e}")
+            return default
+
+    def _prune(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM outcomes WHERE name = ? AND at < ?", (self.name, now - self.window_seconds))
+
+    def _trip(self, conn: sqlite3.Connection, now: float):
+        conn.execute(
+            "UPDATE breakers SET state = ?, opened_at = ?, probe_until = 0, times_opened = times_opened + 1 "
+            "WHERE name = ?",
+            (OPEN, now, self.name),
+        )
+        logger.warning(f"Circuit breaker {self.name} opened for {self.cooldown_seconds:.0f}s")
+
+    @property
+    def state(self) -> str:
+        return self._transaction(lambda conn, now: self._load(conn, now)[0], CLOSED)
+
+    def allow_request(self) -> bool:
+        def body(conn, now):
+            state, _, probe_until = self._load(conn, now)
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and probe_until <= now:
+                conn.execute(
+                    "UPDATE breakers SET probe_until = ? WHERE name = ?", (now + self.probe_lease_seconds, self.name)
+                )
+                return True
+            return False
+
+        return self._transaction(body, True)
+
+    def record_success(self):
+        def body(conn, now):
+            state, _, _ = self._load(conn, now)
+            conn.execute("UPDATE breakers SET total_successes = total_successes + 1 WHERE name = ?", (self.name,))
+            if state == HALF_OPEN:
+                conn.execute("UPDATE breakers SET state = ?, probe_until = 0 WHERE name = ?", (CLOSED, self.name))
+                conn.execute("DELETE FROM outcomes WHERE name = ?", (self.name,))
+            conn.execute("INSERT INTO outcomes(name, at, ok) VALUES(?, ?, 1)", (self.name, now))
+            self._prune(conn, now)
+
+        self._transaction(body, None)
+
+    def record_failure(self):
+        def body(conn, now):
+            state, _, _ = self._load(conn, now)
+            conn.execute("UPDATE breakers SET total_failures = total_failures + 1 WHERE name = ?", (self.name,))
+            if state == HALF_OPEN:
+                self._trip(conn, now)
+                return
+            conn.execute("INSERT INTO outcomes(name, at, ok) VALUES(?, ?, 0)", (self.name, now))
+            self._prune(conn, now)
+            calls, failures = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(1 - ok), 0) FROM outcomes WHERE name = ?", (self.name,)
+            ).fetchone()
+            if state == CLOSED and calls >= self.min_calls and failures / calls >= self.failure_rate_threshold:
+                self._trip(conn, now)
+
+        self._transaction(body, None)
+
+    def release_probe(self):
+        """Give back a half-open probe slot whose call was abandoned (e.g. a cancelled hedge)."""
+        self._transaction(
+            lambda conn, now: conn.execute(
+                "UPDATE breakers SET probe_until = 0 WHERE name = ? AND state = ?", (self.name, HALF_OPEN)
+            ),
+            None,
+        )
+
+    def snapshot(self) -> Dict:
+        def body(conn, now):
+            state, opened_at, probe_until = self._load(conn, now)
+            self._prune(conn, now)
+            calls, failures = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(1 - ok), 0) FROM outcomes WHERE name = ?", (self.name,)
+            ).fetchone()
+            times_opened, successes, total_failures = conn.execute(
+                "SELECT times_opened, total_successes, total_failures FROM breakers WHERE name = ?", (self.name,)
+            ).fetchone()
+            retry_in = max(0.0, self.cooldown_seconds - (now - opened_at)) if state == OPEN else 0.0
+            return {
+                "state": state,
+                "healthy": state == CLOSED,
+                "window_calls": calls,
+                "window_failures": failures,
+                "failure_rate": round(failures / calls, 3) if calls else 0.0,
+                "retry_in_seconds": round(retry_in, 1),
+                "probe_in_flight": state == HALF_OPEN and probe_until > now,
+                "times_opened": times_opened,
+                "total_successes": successes,
+                "total_failures": total_failures,
+            }
+
+        return self._transaction(body, {"state": CLOSED, "healthy": True, "error": "breaker state unavailable"})
+
+
+def _new_breaker(name: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        settings.llm_breaker_path,
+        failure_rate_threshold=settings.llm_breaker_failure_rate,
+        window_seconds=settings.llm_breaker_window_seconds,
+        min_calls=settings.llm_breaker_min_calls,
+        cooldown_seconds=settings.llm_breaker_cooldown_seconds,
+        probe_lease_seconds=settings.llm_breaker_probe_lease_seconds,
+    )
+
+
+breakers: Dict[str, CircuitBreaker] = {"openai": _new_breaker("openai"), "gemini": _new_breaker("gemini")}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    breaker = breakers.get(name)
+    if breaker is None:
+        breaker = breakers[name] = _new_breaker(name)
+    return breaker
+
+
+def breaker_status() -> Dict[str, Dict]:
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
@@ -4,6 +4,7 @@ from typing import Optional, Dict
 import cloudinary
 import cloudinary.uploader
 from app.core.config import settings 
+from app.replay import recorded
 logger = logging.getLogger(__name__)
 cloudinary.config(
     cloud_name=settings.cloudinary_cloud_name,
@@ -37,6 +38,7 @@ cloudinary.config(
 #     except Exception as e:
 #         logger.error(f"Cloudinary upload failed ({public_id}): {e}")
 #         return None
+@recorded("upload")
 def upload_source(file_content: bytes, public_id: str):
     if not file_content:
         return None
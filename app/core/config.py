@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings 
-from typing import Optional,List
+from typing import Dict,Optional,List
 class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME:str='Data AI Backend'
@@ -22,6 +22,110 @@ class Settings(BaseSettings):
     cloudinary_api_secret:str 
     cloudinary_folder:str=''
     serpapi_key:str
+    llm_cache_enabled:bool=True
+    llm_cache_path:str='./storage/cache/llm_responses.sqlite3'
+    llm_cache_max_entries:int=20000
+    llm_cache_ttl_seconds:int=60 * 60 * 24 * 30
+    llm_rate_limit_path:str='./storage/cache/rate_limits.sqlite3'
+    openai_requests_per_minute:int=500
+    openai_tokens_per_minute:int=500000
+    gemini_requests_per_minute:int=1000
+    gemini_tokens_per_minute:int=1000000
+    llm_expected_completion_tokens:int=1500
+    llm_rate_limit_retries:int=2
+    llm_rate_limit_backoff_seconds:float=2.0
+    llm_rate_limit_max_backoff_seconds:float=60.0
+    llm_max_concurrency:int=8
+    llm_standardize_chunk_size:int=20
+    llm_hedge_enabled:bool=False
+    llm_hedge_quantile:float=0.95
+    llm_hedge_initial_delay_seconds:float=10.0
+    llm_hedge_min_delay_seconds:float=1.0
+    llm_hedge_max_delay_seconds:float=30.0
+    llm_hedge_min_samples:int=20
+    llm_breaker_failure_rate:float=0.5
+    llm_breaker_window_seconds:float=60.0
+    llm_breaker_min_calls:int=4
+    llm_breaker_cooldown_seconds:float=30.0
+    llm_breaker_path:str='./storage/cache/circuit_breakers.sqlite3'
+    llm_breaker_probe_lease_seconds:float=120.0
+    extraction_policy:str='deterministic_first'
+    deterministic_min_score:float=0.6
+    deterministic_target_attributes:int=12
+    llm_discover_html_tokens:int=1500
+    llm_extract_html_tokens:int=3000
+    openai_input_cost_per_million:float=1.25
+    openai_output_cost_per_million:float=10.0
+    gemini_input_cost_per_million:float=0.10
+    gemini_output_cost_per_million:float=0.40
+    replay_mode:str='off'
+    replay_archive_path:str='./storage/replay'
+    replay_latency_scale:float=0.0
+    replay_latency_seconds:float=0.0
+    golden_record_min_specs:int=4
+    golden_record_min_attribute_confidence:float=0.5
+    golden_record_llm_review:bool=False
+    vocabulary_enabled:bool=True
+    vocabulary_refresh_seconds:float=300.0
+    vocabulary_min_confidence:float=0.8
+    unify_chunk_size:int=40
+    http_timeout_seconds:float=40.0
+    http_connect_timeout_seconds:float=10.0
+    http_max_connections:int=100
+    http_max_keepalive_connections:int=20
+    http_max_concurrent_requests:int=32
+    http_per_host_connections:int=4
+    source_fetch_parallelism:int=4
+    browser_pool_size:int=4
+    browser_recycle_pages:int=200
+    browser_memory_limit_mb:float=1500.0
+    browser_page_timeout_ms:int=30000
+    browser_lean_mode:bool=True
+    browser_ready_timeout_ms:int=5000
+    serp_cache_enabled:bool=True
+    serp_cache_path:str='./storage/cache/serp.sqlite3'
+    serp_cache_max_entries:int=50000
+    serp_cache_ttl_seconds:int=60 * 60 * 24 * 7
+    serp_cache_negative_ttl_seconds:int=60 * 60 * 6
+    source_store_path:str='./storage'
+    source_store_index_path:str='./storage/cache/source_index.sqlite3'
+    source_store_max_entries:int=100000
+    source_store_revalidate_seconds:int=60 * 60
+    archival_backend:str='cloudinary'
+    archival_local_path:str='./storage/archive'
+    archival_queue_path:str='./storage/cache/archival_queue.sqlite3'
+    archival_batch_size:int=8
+    archival_concurrency:int=4
+    archival_max_attempts:int=6
+    archival_backoff_seconds:float=5.0
+    archival_max_backoff_seconds:float=600.0
+    archival_lease_seconds:float=300.0
+    archival_poll_seconds:float=2.0
+    archival_drainer_enabled:bool=True
+    coverage_target_attributes:int=20
+    category_coverage_targets:Dict[str,int]={}
+    coverage_min_confidence:float=0.75
+    source_budget_min:int=1
+    source_budget_max:int=6
+    source_extract_parallelism:int=2
+    serp_max_calls:int=2
+    download_max_mb:float=50.0
+    download_chunk_bytes:int=64 * 1024
+    fetch_scheduler_path:str='./storage/cache/fetch_hosts.sqlite3'
+    fetch_per_host_concurrency:int=2
+    fetch_min_interval_seconds:float=1.0
+    fetch_ewma_alpha:float=0.3
+    fetch_ewma_min_samples:int=3
+    fetch_timeout_multiplier:float=4.0
+    fetch_min_timeout_seconds:float=5.0
+    fetch_failure_threshold:int=3
+    fetch_cooloff_seconds:float=60.0
+    fetch_max_cooloff_seconds:float=1800.0
+    worker_pool_size:int=5
+    worker_max_tasks:int=50
+    worker_task_timeout_seconds:float=600.0
+    worker_startup_timeout_seconds:float=120.0
+    worker_pool_prestart:bool=True
     class Config:
         env_file='.env'
         env_file_encoding='utf-8'
@@ -0,0 +1,155 @@
+import json
+import logging
+import re
+from typing import Any, Dict, Iterable
+
+from bs4 import BeautifulSoup
+
+from app.core.config import settings
+from app.utils import is_invalid
+
+logger = logging.getLogger("aggregation_engine")
+
+# JSON-LD / microdata keys that describe the page or offer rather than the product spec.
+NON_SPEC_KEYS = {
+    "@context", "@type", "@id", "url", "image", "description", "offers", "review", "reviews",
+    "aggregaterating", "potentialaction", "breadcrumb", "mainentityofpage", "logo", "sameas",
+}
+
+
+def _clean(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def _add(attributes: Dict[str, str], key: str, value: Any) -> bool:
+    key = _clean(str(key)).rstrip(":").strip()
+    value = _clean(str(value)) if value is not None else ""
+    if not key or not value or not (2 <= len(key) <= 80) or len(value) > 300:
+        return False
+    if key.lower() in NON_SPEC_KEYS or key.lower().startswith(("http", "www")):
+        return False
+    attributes.setdefault(key, value)
+    return True
+
+
+def _from_tables(soup, attributes) -> int:
+    found = 0
+    for table in soup.find_all("table"):
+        for row in table.find_all("tr"):
+            cells = row.find_all(["td", "th"])
+            if len(cells) == 2 and not all(c.name == "th" for c in cells):
+                found += _add(attributes, cells[0].get_text(" ", strip=True), cells[1].get_text(" ", strip=True))
+    return found
+
+
+def _from_definition_lists(soup, attributes) -> int:
+    found = 0
+    for dl in soup.find_all("dl"):
+        for dt in dl.find_all("dt"):
+            dd = dt.find_next_sibling("dd")
+            if dd is not None:
+                found += _add(attributes, dt.get_text(" ", strip=True), dd.get_text(" ", strip=True))
+    return found
+
+
+def _json_ld_products(node) -> Iterable[Dict]:
+    if isinstance(node, list):
+        for item in node:
+            yield from _json_ld_products(item)
+    elif isinstance(node, dict):
+        types = node.get("@type", "")
+        types = types if isinstance(types, list) else [types]
+        if any("Product" in str(t) for t in types):
+            yield node
+        for child in node.get("@graph", []) if isinstance(node.get("@graph"), list) else []:
+            yield from _json_ld_products(child)
+
+
+def _from_json_ld(soup, attributes) -> int:
+    found = 0
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(script.string or "")
+        except (ValueError, TypeError):
+            continue
+        for product in _json_ld_products(data):
+            for key, val in product.items():
+                if isinstance(val, (str, int, float)):
+                    found += _add(attributes, key.title(), val)
+                elif isinstance(val, dict) and val.get("name") and key.lower() == "brand":
+                    found += _add(attributes, "Brand", val["name"])
+            props = product.get("additionalProperty") or []
+            for prop in props if isinstance(props, list) else [props]:
+                if isinstance(prop, dict):
+                    value = prop.get("value")
+                    if prop.get("unitText") and value is not None:
+                        value = f"{value} {prop['unitText']}"
+                    found += _add(attributes, prop.get("name", ""), value)
+    return found
+
+
+def _from_microdata(soup, attributes) -> int:
+    found = 0
+    for prop in soup.find_all(attrs={"itemprop": "additionalProperty"}):
+        name = prop.find(attrs={"itemprop": "name"})
+        value = prop.find(attrs={"itemprop": "value"})
+        if name is not None and value is not None:
+            found += _add(
+                attributes,
+                name.get("content") or name.get_text(" ", strip=True),
+                value.get("content") or value.get_text(" ", strip=True),
+            )
+    for scope in soup.find_all(attrs={"itemtype": re.compile(r"schema\.org/Product", re.I)}):
+        for el in scope.find_all(attrs={"itemprop": True}):
+            key = el["itemprop"]
+            if key in ("additionalProperty", "name", "value") or el.has_attr("itemscope"):
+                continue
+            found += _add(attributes, key.title(), el.get("content") or el.get_text(" ", strip=True))
+    return found
+
+
+def _from_meta(soup, attributes) -> int:
+    found = 0
+    for meta in soup.find_all("meta"):
+        prop = meta.get("property") or ""
+        if prop.lower().startswith("product:") and meta.get("content"):
+            found += _add(attributes, prop.split(":")[-1].replace("_", " ").title(), meta["content"])
+    return found
+
+
+STRATEGIES = [
+    ("json_ld", _from_json_ld),
+    ("microdata", _from_microdata),
+    ("table", _from_tables),
+    ("dl", _from_definition_lists),
+    ("meta", _from_meta),
+]
+
+
+def score_extraction(attributes: Dict[str, str]) -> float:
+    """0..1 score: coverage against deterministic_target_attributes times the share of clean key/value pairs."""
+    if not attributes:
+        return 0.0
+    clean = 0
+    for key, value in attributes.items():
+        value = str(value)
+        if is_invalid(value) or len(value) > 200:
+            continue
+        if not re.search(r"[A-Za-z]", key) or len(key.split()) > 8:
+            continue
+        clean += 1
+    coverage = min(len(attributes) / max(settings.deterministic_target_attributes, 1), 1.0)
+    return round(coverage * clean / len(attributes), 3)
+
+
+def extract_structured(html: str) -> Dict:
+    """Pull attributes from tables, definition lists, JSON-LD, microdata and product meta tags without an LLM."""
+    attributes: Dict[str, str] = {}
+    strategies: Dict[str, int] = {}
+    try:
+        soup = BeautifulSoup(html, "html.parser")
+        for name, strategy in STRATEGIES:
+            strategies[name] = strategy(soup, attributes)
+    except Exception as e:
+        logger.error(f"Deterministic extraction error: {e}")
+    return {"attributes": attributes, "strategies": strategies, "score": score_extraction(attributes)}
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(*parts: Any) -> str:
+    """Stable sha256 fingerprint of JSON-serialisable parts."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """SQLite-backed key/value cache with per-entry TTL and LRU eviction.
+
+    The database file is shared by every process that opens the same path,
+    so worker processes and the API process see the same entries and the
+    same hit/miss counters.
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000, default_ttl: Optional[float] = None):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " expires_at REAL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _bump(self, conn: sqlite3.Connection, name: str, amount: int = 1):
+        conn.execute(
+            "INSERT INTO counters(name, value) VALUES(?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._bump(conn, "misses")
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._bump(conn, "misses")
+                self._bump(conn, "expired")
+                return None
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._bump(conn, "hits")
+            return json.loads(value)
+        except sqlite3.Error as e:
+            logger.warning(f"Cache read failed ({self.path}): {e}")
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        now = time.time()
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl else None
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries(key, value, created_at, expires_at, accessed_at) "
+                "VALUES(?, ?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False, default=str), now, expires_at, now),
+            )
+            self._evict(conn)
+        except sqlite3.Error as e:
+            logger.warning(f"Cache write failed ({self.path}): {e}")
+
+    def delete(self, key: str):
+        try:
+            self._connect().execute("DELETE FROM entries WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.warning(f"Cache delete failed ({self.path}): {e}")
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM counters")
+
+    def _evict(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        (count,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            self._bump(conn, "evictions", overflow)
+
+    def incr(self, name: str, amount: int = 1):
+        try:
+            self._bump(self._connect(), name, amount)
+        except sqlite3.Error as e:
+            logger.warning(f"Cache counter update failed ({self.path}): {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        (entries,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "path": str(self.path),
+            "entries": entries,
+            "max_entries": self.max_entries,
+            **counters,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
@@ -35,5 +35,5 @@ Do it now.'''
         "additionalProperties": False
     }
 
-    result = call_llm(prompt, schema)
+    result = call_llm(prompt, schema, context="enrich_product")
     return EnrichmentResult(**result)
\ No newline at end of file
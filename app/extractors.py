@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import Optional, List, Dict
 import fitz
@@ -6,10 +7,15 @@ import pandas as pd
 import cv2
 import pytesseract
 import requests
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
+from playwright.async_api import TimeoutError as PlaywrightTimeout
 from pathlib import Path
 import httpx
 from bs4 import BeautifulSoup
+from app.replay import recorded
+from app.async_runtime import run_sync
+from app.browser_pool import get_browser_pool
+from app.core.config import settings
+from app.fetch_scheduler import HostCoolingOff, fetch_scheduler
 
 MAX_PDF_MB = 100
 MAX_IMAGE_MB = 10
@@ -19,34 +25,45 @@ logger = logging.getLogger(__name__)
 
 def extract_web(url: str):
     try:
-        resp = httpx.get(url, timeout=15, headers={
-                         "User-Agent": "Mozilla/5.0"})
+        with fetch_scheduler.slot_sync(url, "extract_web", 15) as slot:
+            resp = httpx.get(url, timeout=slot.timeout, headers={
+                             "User-Agent": "Mozilla/5.0"})
+            slot.report_status(resp.status_code, resp.headers.get("Retry-After"))
         if resp.status_code == 200 and len(resp.text) > 1000:
             soup = BeautifulSoup(resp.text, "html.parser")
             for s in soup(["script", "style", "nav", "footer", "header", "svg", "noscript", "iframe"]):
                 s.decompose()
             content = soup.find('main') or soup.find('body')
             return content.get_text(separator=' ', strip=True)
+    except HostCoolingOff as e:
+        logger.info(f"Skipping {url}: {e}")
+        return None
     except:
         pass
 
     return extract_web_playwright(url)
 
 
-def extract_web_playwright(url: str, timeout: int = 30_000) -> Optional[str]:
+def extract_web_playwright(url: str, timeout: Optional[int] = None) -> Optional[str]:
+    return run_sync(extract_web_playwright_async(url, timeout))
+
+
+@recorded("playwright")
+async def extract_web_playwright_async(url: str, timeout: Optional[int] = None) -> Optional[str]:
+    """Render ``url`` on the shared browser pool; one page navigation instead of a browser start.
+
+    ``timeout`` (ms) caps the navigation; the host's latency history may shorten it.
+    """
+    default_timeout = (timeout or settings.browser_page_timeout_ms) / 1000
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent="Mozilla/5.0 (compatible; DataAggregationBot/1.0)"
+        async with fetch_scheduler.slot(url, "playwright", default_timeout) as slot:
+            # Cap the whole render (pool wait included) a little above the navigation timeout.
+            return await asyncio.wait_for(
+                get_browser_pool().render(url, int(slot.timeout * 1000)), slot.timeout + 15
             )
-            page = context.new_page()
-            page.goto(url, timeout=timeout, wait_until="domcontentloaded")
-            page.wait_for_timeout(2000)
-            content = page.content()
-            browser.close()
-            return content
-    except PlaywrightTimeout:
+    except HostCoolingOff as e:
+        logger.info(f"Skipping render of {url}: {e}")
+    except (PlaywrightTimeout, asyncio.TimeoutError):
         logger.warning(f"Timeout loading {url}")
     except Exception as e:
         logger.error(f"Playwright failed on {url}: {e}")
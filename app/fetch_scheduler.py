@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+from app.metrics import incr
+
+logger = logging.getLogger("aggregation_engine")
+
+# Statuses that mean the host is struggling or throttling us, as opposed to "no such page".
+FAILURE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HostCoolingOff(Exception):
+    """The host failed repeatedly and is skipped until its cool-off ends."""
+
+
+def host_of(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class FetchSlot:
+    """Handle for one scheduled fetch; ``timeout`` is the adaptive budget in seconds."""
+
+    def __init__(self, host: str, kind: str, timeout: float):
+        self.host = host
+        self.kind = kind
+        self.timeout = timeout
+        self.status: Optional[int] = None
+        self.retry_after: Optional[float] = None
+        self.failed = False
+
+    def fail(self, status: Optional[int] = None, retry_after: Optional[float] = None):
+        self.failed = True
+        self.status = status
+        self.retry_after = retry_after
+
+    def report_status(self, status: int, retry_after: Optional[str] = None):
+        if status in FAILURE_STATUSES:
+            try:
+                seconds = float(retry_after) if retry_after else None
+            except ValueError:
+                seconds = None
+            self.fail(status, seconds)
+
+
+class FetchScheduler:
+    """Per-host politeness for source fetching, shared across processes through a SQLite file.
+
+    Every download, extract_web request and Playwright render of a host takes
+    a slot: at most ``fetch_per_host_concurrency`` at once per process, and
+    requests to a host start at least ``fetch_min_interval_seconds`` apart
+    across all workers. Timeouts follow an EWMA of the host's recent latency
+    (per fetch kind), never above the kind's default. A host that fails
+    ``fetch_failure_threshold`` times in a row is skipped for an exponentially
+    growing cool-off.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._loop_limits = weakref.WeakKeyDictionary()
+        self._thread_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._thread_limits_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS hosts ("
+                " host TEXT PRIMARY KEY,"
+                " next_slot_at REAL NOT NULL DEFAULT 0,"
+                " failures INTEGER NOT NULL DEFAULT 0,"
+                " blocked_until REAL NOT NULL DEFAULT 0,"
+                " backoff REAL NOT NULL DEFAULT 0,"
+                " requests INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS latency ("
+                " key TEXT PRIMARY KEY,"
+                " ewma REAL NOT NULL,"
+                " samples INTEGER NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _reserve(self, host: str, kind: str, default_timeout: float) -> Tuple[float, float]:
+        """Book the host's next request slot; return (seconds to wait, timeout). Raises HostCoolingOff."""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR IGNORE INTO hosts(host) VALUES(?)", (host,))
+            next_slot_at, blocked_until = conn.execute(
+                "SELECT next_slot_at, blocked_until FROM hosts WHERE host = ?", (host,)
+            ).fetchone()
+            if blocked_until > now:
+                conn.execute("COMMIT")
+                raise HostCoolingOff(f"{host} cooling off for {blocked_until - now:.0f}s")
+            start = max(now, next_slot_at)
+            conn.execute(
+                "UPDATE hosts SET next_slot_at = ?, requests = requests + 1 WHERE host = ?",
+                (start + settings.fetch_min_interval_seconds, host),
+            )
+            row = conn.execute("SELECT ewma, samples FROM latency WHERE key = ?", (f"{kind}:{host}",)).fetchone()
+            conn.execute("COMMIT")
+        except HostCoolingOff:
+            raise
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        timeout = default_timeout
+        if row and row[1] >= settings.fetch_ewma_min_samples:
+            timeout = min(max(row[0] * settings.fetch_timeout_multiplier, settings.fetch_min_timeout_seconds),
+                          default_timeout)
+        return start - now, timeout
+
+    def _report(self, slot: FetchSlot, seconds: float):
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if slot.failed:
+                    failures, backoff = conn.execute(
+                        "SELECT failures, backoff FROM hosts WHERE host = ?", (slot.host,)
+                    ).fetchone()
+                    failures += 1
+                    blocked_until = 0.0
+                    if failures >= settings.fetch_failure_threshold or slot.retry_after:
+                        backoff = min(max(backoff * 2, settings.fetch_cooloff_seconds), settings.fetch_max_cooloff_seconds)
+                        blocked_until = now + max(backoff, slot.retry_after or 0.0)
+                        logger.warning(
+                            f"{slot.host} failed {failures} times in a row, skipping it for {blocked_until - now:.0f}s"
+                        )
+                    conn.execute(
+                        "UPDATE hosts SET failures = ?, backoff = ?, blocked_until = ? WHERE host = ?",
+                        (failures, backoff, blocked_until, slot.host),
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE hosts SET failures = 0, backoff = 0 WHERE host = ?", (slot.host,)
+                    )
+                    key = f"{slot.kind}:{slot.host}"
+                    row = conn.execute("SELECT ewma, samples FROM latency WHERE key = ?", (key,)).fetchone()
+                    alpha = settings.fetch_ewma_alpha
+                    ewma = seconds if row is None else alpha * seconds + (1 - alpha) * row[0]
+                    conn.execute(
+                        "INSERT OR REPLACE INTO latency(key, ewma, samples) VALUES(?, ?, ?)",
+                        (key, ewma, (row[1] if row else 0) + 1),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.warning(f"Fetch scheduler update failed for {slot.host}: {e}")
+
+    def _host_limit(self, host: str) -> asyncio.Semaphore:
+        limits = self._loop_limits.setdefault(asyncio.get_running_loop(), {})
+        semaphore = limits.get(host)
+        if semaphore is None:
+            semaphore = limits[host] = asyncio.Semaphore(settings.fetch_per_host_concurrency)
+        return semaphore
+
+    def _thread_limit(self, host: str) -> threading.BoundedSemaphore:
+        with self._thread_limits_lock:
+            semaphore = self._thread_limits.get(host)
+            if semaphore is None:
+                semaphore = self._thread_limits[host] = threading.BoundedSemaphore(settings.fetch_per_host_concurrency)
+            return semaphore
+
+    def _book(self, host: str, kind: str, default_timeout: float) -> Tuple[float, float]:
+        try:
+            wait, timeout = self._reserve(host, kind, default_timeout)
+        except HostCoolingOff:
+            incr("fetch_hosts_cooling_off")
+            raise
+        except sqlite3.Error as e:
+            logger.warning(f"Fetch scheduler unavailable, fetching {host} unscheduled: {e}")
+            return 0.0, default_timeout
+        if wait > 0:
+            incr("fetch_politeness_waits")
+        return wait, timeout
+
+    @asynccontextmanager
+    async def slot(self, url: str, kind: str, default_timeout: float):
+        """Wait for a polite slot on ``url``'s host and yield a FetchSlot; exceptions count as failures."""
+        host = host_of(url)
+        async with self._host_limit(host):
+            # Booking and reporting are BEGIN IMMEDIATE transactions; keep them off the event loop.
+            wait, timeout = await asyncio.to_thread(self._book, host, kind, default_timeout)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            slot = FetchSlot(host, kind, timeout)
+            started = time.monotonic()
+            try:
+                yield slot
+            except Exception:
+                slot.fail()
+                await asyncio.to_thread(self._report, slot, time.monotonic() - started)
+                raise
+            except BaseException:
+                # Cancelled (e.g. coverage was met): says nothing about the host, so nothing is recorded.
+                incr("fetch_cancelled")
+                raise
+            await asyncio.to_thread(self._report, slot, time.monotonic() - started)
+
+    @contextmanager
+    def slot_sync(self, url: str, kind: str, default_timeout: float):
+        host = host_of(url)
+        with self._thread_limit(host):
+            wait, timeout = self._book(host, kind, default_timeout)
+            if wait > 0:
+                time.sleep(wait)
+            slot = FetchSlot(host, kind, timeout)
+            started = time.monotonic()
+            try:
+                yield slot
+            except Exception:
+                slot.fail()
+                self._report(slot, time.monotonic() - started)
+                raise
+            except BaseException:
+                incr("fetch_cancelled")
+                raise
+            self._report(slot, time.monotonic() - started)
+
+    def stats(self) -> Dict:
+        conn = self._connect()
+        now = time.time()
+        (hosts,) = conn.execute("SELECT COUNT(*) FROM hosts").fetchone()
+        blocked = conn.execute(
+            "SELECT host, failures, blocked_until FROM hosts WHERE blocked_until > ? ORDER BY blocked_until DESC",
+            (now,),
+        ).fetchall()
+        busiest = conn.execute(
+            "SELECT host, requests, failures FROM hosts ORDER BY requests DESC LIMIT 20"
+        ).fetchall()
+        latency = dict(conn.execute("SELECT key, ewma FROM latency").fetchall())
+        return {
+            "path": str(self.path),
+            "hosts": hosts,
+            "cooling_off": [
+                {"host": host, "failures": failures, "seconds_left": round(until - now, 1)}
+                for host, failures, until in blocked
+            ],
+            "busiest": [
+                {
+                    "host": host,
+                    "requests": requests,
+                    "failures": failures,
+                    "latency_ewma": {
+                        kind: round(latency[f"{kind}:{host}"], 3)
+                        for kind in ("download", "extract_web", "playwright")
+                        if f"{kind}:{host}" in latency
+                    },
+                }
+                for host, requests, failures in busiest
+            ],
+        }
+
+
+fetch_scheduler = FetchScheduler(settings.fetch_scheduler_path)
@@ -0,0 +1,150 @@
+import json
+import logging
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+from bs4 import BeautifulSoup
+
+from app.deterministic_extraction import _json_ld_products
+
+logger = logging.getLogger("aggregation_engine")
+
+CHARS_PER_TOKEN = 4
+BOILERPLATE_TAGS = [
+    "script", "style", "noscript", "svg", "iframe", "nav", "footer", "header",
+    "form", "button", "link", "meta", "picture", "video", "audio", "canvas", "template",
+]
+SPEC_HINT = re.compile(r"spec|technical|tech-|details|features|dimension|characteristic|attribute|parameter", re.I)
+BLOCK_WEIGHT = {"json_ld": 5.0, "table": 3.0, "dl": 3.0, "section": 2.0, "ul": 1.0, "ol": 1.0}
+
+
+def _has_spec_context(el) -> bool:
+    for node in [el, *el.parents]:
+        if getattr(node, "attrs", None) is None:
+            continue
+        marker = " ".join([node.get("id") or "", " ".join(node.get("class") or [])])
+        if marker.strip() and SPEC_HINT.search(marker):
+            return True
+    heading = el.find_previous(["h1", "h2", "h3", "h4", "h5", "h6", "caption"])
+    return bool(heading and SPEC_HINT.search(heading.get_text(" ", strip=True)[:80]))
+
+
+def _strip_attributes(el):
+    el.attrs = {}
+    for child in el.find_all(True):
+        child.attrs = {}
+
+
+def _render(el) -> str:
+    _strip_attributes(el)
+    html = re.sub(r"\s+", " ", str(el))
+    return re.sub(r"<(\w+)>\s*</\1>", "", html).strip()
+
+
+def _score(kind: str, el, text: str) -> float:
+    link_chars = sum(len(a.get_text(strip=True)) for a in el.find_all("a"))
+    if link_chars > 0.5 * len(text):
+        return 0.0
+    score = BLOCK_WEIGHT[kind]
+    if _has_spec_context(el):
+        score += 4.0
+    digits = sum(ch.isdigit() for ch in text)
+    score += min(2.0, 20.0 * digits / len(text))
+    rows = len(el.find_all(["tr", "dt", "li"]))
+    score += min(2.0, rows / 10.0)
+    return score
+
+
+@lru_cache(maxsize=8)
+def _spec_blocks(html: str) -> Tuple[str, Tuple[Tuple[float, int, str], ...], str]:
+    """(page heading, scored blocks as (score, document position, rendered html), fallback text)."""
+    soup = BeautifulSoup(html, "html.parser")
+    blocks: List[Tuple[float, int, str]] = []
+
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            products = list(_json_ld_products(json.loads(script.string or "")))
+        except (ValueError, TypeError):
+            continue
+        for product in products:
+            compact = {k: v for k, v in product.items() if k not in ("@context", "review", "offers", "image")}
+            blocks.append((BLOCK_WEIGHT["json_ld"], -1, json.dumps(compact, ensure_ascii=False)))
+
+    title = soup.title.get_text(" ", strip=True) if soup.title else ""
+    h1 = soup.find("h1")
+    heading = " | ".join(t for t in [title, h1.get_text(" ", strip=True) if h1 else ""] if t)
+
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+
+    candidates = []
+    sections = set()
+    for position, el in enumerate(soup.find_all(["table", "dl", "ul", "ol", "section", "div"])):
+        kind = el.name
+        if any(id(parent) in sections for parent in el.parents):
+            continue  # already covered by an enclosing spec section
+        if kind == "table" and el.find("table"):
+            continue  # layout table; its inner tables are candidates on their own
+        if kind in ("ul", "ol") and (el.find_parent(["table", "dl"]) or el.find("table")):
+            continue
+        if kind in ("section", "div"):
+            marker = " ".join([el.get("id") or "", " ".join(el.get("class") or [])])
+            if not (marker.strip() and SPEC_HINT.search(marker)) or el.find(["table", "dl"]):
+                continue
+            kind = "section"
+            sections.add(id(el))
+        candidates.append((position, kind, el))
+
+    seen = set()
+    for position, kind, el in candidates:
+        text = el.get_text(" ", strip=True)
+        if len(text) < 20 or text in seen:
+            continue
+        score = _score(kind, el, text)
+        if score <= 0:
+            continue
+        seen.add(text)
+        blocks.append((score, position, el))
+
+    rendered = tuple(
+        (score, position, el if isinstance(el, str) else _render(el)) for score, position, el in blocks
+    )
+    body = soup.find("main") or soup.body or soup
+    fallback = re.sub(r"\s+", " ", body.get_text(" ", strip=True))
+    return heading, rendered, fallback
+
+
+def condense_html(html: str, max_tokens: int) -> str:
+    """Boilerplate-free, spec-dense excerpt of ``html`` packed into roughly ``max_tokens`` tokens.
+
+    Tables, definition lists, lists and spec-labelled sections are ranked by
+    spec context (nearby headings / ids such as "specifications"), numeric
+    density and row count, then the best are kept in document order until
+    the budget is spent. Pages without such regions fall back to the
+    visible body text.
+    """
+    budget = max_tokens * CHARS_PER_TOKEN
+    try:
+        heading, blocks, fallback = _spec_blocks(html)
+    except Exception as e:
+        logger.warning(f"HTML condensation failed, using raw prefix: {e}")
+        return html[:budget]
+
+    chosen = []
+    used = len(heading)
+    for score, position, block in sorted(blocks, key=lambda b: -b[0]):
+        if used >= budget:
+            break
+        if used + len(block) > budget:
+            if chosen:
+                continue
+            block = block[: budget - used]
+        chosen.append((position, block))
+        used += len(block) + 1
+
+    if not chosen:
+        return "\n".join(t for t in [heading, fallback[: budget - len(heading)]] if t)
+    parts = [heading] if heading else []
+    parts.extend(block for _, block in sorted(chosen))
+    return "\n".join(parts)
@@ -0,0 +1,58 @@
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from typing import Dict
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import settings
+
+DEFAULT_HEADERS = {"User-Agent": "TruthEngine/1.0"}
+
+
+class _LoopClients:
+    """Pooled client and concurrency limits belonging to one event loop."""
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=httpx.Timeout(settings.http_timeout_seconds, connect=settings.http_connect_timeout_seconds),
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+                keepalive_expiry=30.0,
+            ),
+            follow_redirects=True,
+            verify=False,
+        )
+        self.global_limit = asyncio.Semaphore(settings.http_max_concurrent_requests)
+        self.host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).hostname or ""
+        semaphore = self.host_limits.get(host)
+        if semaphore is None:
+            semaphore = self.host_limits[host] = asyncio.Semaphore(settings.http_per_host_connections)
+        return semaphore
+
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def _loop_clients() -> _LoopClients:
+    loop = asyncio.get_running_loop()
+    clients = _clients.get(loop)
+    if clients is None or clients.client.is_closed:
+        clients = _clients[loop] = _LoopClients()
+    return clients
+
+
+@asynccontextmanager
+async def stream(url: str, **kwargs):
+    """Streaming GET on the shared client; the concurrency slots are held until the body is consumed."""
+    clients = _loop_clients()
+    async with clients.global_limit, clients.host_limit(url):
+        async with clients.client.stream("GET", url, **kwargs) as response:
+            yield response
+
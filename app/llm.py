@@ -1,10 +1,38 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import google.generativeai as genai
+import asyncio
+import contextvars
+import copy
 import json
+import threading
 import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from app.core.config import settings
+from app.disk_cache import DiskCache, make_key
+from app.rate_limiter import rate_limiter, estimate_tokens, is_rate_limit_error, retry_after_seconds
+from app.singleflight import SingleFlight
+from app.llm_hedging import record_latency, hedge_delay
+from app.circuit_breaker import get_breaker, breaker_status
+from app.replay import recorded, active as replay_active
+from app.metrics import track_llm_call, note_attempt, note_cache_hit, note_error, note_retry, note_usage
 client = OpenAI(api_key=settings.openai_api_key)
+async_client = AsyncOpenAI(api_key=settings.openai_api_key)
 genai.configure(api_key=settings.gemini_api_key)
+response_cache = DiskCache(
+    settings.llm_cache_path,
+    max_entries=settings.llm_cache_max_entries,
+    default_ttl=settings.llm_cache_ttl_seconds,
+)
+# Identical prompts issued concurrently (same MPN in a batch, duplicate
+# /extract requests) share one upstream call.
+in_flight = SingleFlight()
+
+
+def cache_key(prompt: str, schema: dict) -> str:
+    return make_key(settings.llm_model, settings.gemini_model, prompt, schema)
+
+
 def parse_response(content:str)->dict:
     content=content.strip()
     print(f"Raw content: {repr(content)}")
@@ -14,14 +42,176 @@ def parse_response(content:str)->dict:
         content = content[3:-3]
     print(f"After stripping: {repr(content)}")
     return json.loads(content)
-    
-def call_llm(prompt: str, schema: dict) -> dict:
-    time.sleep(4)
+
+
+def call_llm(prompt: str, schema: dict, use_cache: bool = True, context: str = "") -> dict:
+    with track_llm_call(context):
+        # Record/replay runs must reach the upstream layer on every call.
+        use_cache = use_cache and settings.llm_cache_enabled and not replay_active()
+        key = cache_key(prompt, schema)
+        if use_cache:
+            cached = response_cache.get(key)
+            if cached is not None:
+                print(f"LLM cache hit: {key[:12]}")
+                note_cache_hit()
+                return cached
+
+        def fetch():
+            result = _call_upstream(prompt, schema)
+            if use_cache and isinstance(result, dict) and "error" not in result:
+                response_cache.set(key, result)
+            return result
+
+        # Coalesced callers receive the same object, so each gets its own copy to mutate.
+        result = copy.deepcopy(in_flight.do(key, fetch))
+        if isinstance(result, dict) and "error" in result:
+            note_error()
+        return result
+
+
+@recorded("llm", key=cache_key)
+def _call_upstream(prompt: str, schema: dict) -> dict:
+    if settings.llm_hedge_enabled:
+        return _call_upstream_hedged(prompt, schema)
+    errors = []
+    candidates = iter(PROVIDERS)
+    provider = _next_available(candidates)
+    while provider:
+        name, fn = provider
+        try:
+            return _timed(name, fn, prompt, schema)
+        except Exception as e:
+            print(f"{name} failed:{str(e)}")
+            errors.append(f"{name}: {e}")
+        provider = _next_available(candidates)
+        if provider:
+            print(f"---Switching to {provider[0]} backup")
+    return {"error": "; ".join(errors) or "all LLM providers unavailable (circuit open)"}
+
+
+def _next_available(candidates):
+    """Next provider whose circuit breaker lets a request through, or None."""
+    for name, fn in candidates:
+        if get_breaker(name).allow_request():
+            return name, fn
+        print(f"---Skipping {name}: circuit {get_breaker(name).state}")
+    return None
+
+
+def _timed(provider: str, fn, prompt: str, schema: dict) -> dict:
+    breaker = get_breaker(provider)
+    started = time.monotonic()
     try:
-        print(f"Using model: {settings.llm_model}")
-        print(f"API key exists: {bool(settings.openai_api_key)}")
-    
-        response = client.chat.completions.create(
+        result = fn(prompt, schema)
+    except Exception:
+        breaker.record_failure()
+        note_attempt(provider, False)
+        raise
+    breaker.record_success()
+    note_attempt(provider, True)
+    record_latency(provider, time.monotonic() - started)
+    return result
+
+
+HEDGE_POOL_SIZE = 16
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix="llm-hedge")
+# One slot per pool thread: an attempt is only submitted when a thread is free to
+# start it at once, so hedges never sit in the pool queue behind other hedges.
+_hedge_slots = threading.BoundedSemaphore(HEDGE_POOL_SIZE)
+
+
+def _submit_hedge(provider: str, fn, prompt: str, schema: dict):
+    """Start an attempt on a free hedge thread; None if every thread is busy."""
+    if not _hedge_slots.acquire(blocking=False):
+        return None
+    # Run in a copy of the caller's context so the attempt is attributed to its call record.
+    future = _hedge_pool.submit(contextvars.copy_context().run, _timed, provider, fn, prompt, schema)
+    future.add_done_callback(lambda _: _hedge_slots.release())
+    return future
+
+
+def _call_upstream_hedged(prompt: str, schema: dict) -> dict:
+    """Fire the backup provider if the primary has not answered within its hedge delay; first valid JSON wins."""
+    candidates = iter(PROVIDERS)
+    primary = _next_available(candidates)
+    if primary is None:
+        return {"error": "all LLM providers unavailable (circuit open)"}
+    first = _submit_hedge(primary[0], primary[1], prompt, schema)
+    if first is None:
+        # Hedge threads saturated: run the primary inline, falling back to the backup without a hedge.
+        try:
+            return _timed(primary[0], primary[1], prompt, schema)
+        except Exception as e:
+            print(f"{primary[0]} failed:{str(e)}")
+            secondary = _next_available(candidates)
+            if secondary is None:
+                return {"error": f"{primary[0]}: {e}"}
+            print(f"---Switching to {secondary[0]} backup")
+            try:
+                return _timed(secondary[0], secondary[1], prompt, schema)
+            except Exception as e2:
+                print(f"{secondary[0]} failed:{str(e2)}")
+                return {"error": f"{primary[0]}: {e}; {secondary[0]}: {e2}"}
+    pending = {first: primary[0]}
+    done, _ = wait(pending, timeout=hedge_delay(primary[0]))
+    errors = []
+    for future in done:
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"{primary[0]} failed:{str(e)}")
+            errors.append(f"{primary[0]}: {e}")
+        pending.pop(future)
+    secondary = _next_available(candidates)
+    if secondary:
+        hedge = _submit_hedge(secondary[0], secondary[1], prompt, schema)
+        if hedge is None:
+            print(f"---Not hedging to {secondary[0]}: hedge threads busy")
+            get_breaker(secondary[0]).release_probe()
+        else:
+            print(f"---Hedging to {secondary[0]}")
+            pending[hedge] = secondary[0]
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            provider = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"{provider} failed:{str(e)}")
+                errors.append(f"{provider}: {e}")
+                continue
+            # A running thread cannot be interrupted; its answer is simply discarded.
+            # A loser that never started must hand back any half-open probe it held.
+            for loser, name in pending.items():
+                if loser.cancel():
+                    get_breaker(name).release_probe()
+            return result
+    return {"error": "; ".join(errors)}
+
+
+def _with_rate_limit(provider: str, prompt: str, send):
+    estimated = estimate_tokens(prompt) + settings.llm_expected_completion_tokens
+    for attempt in range(settings.llm_rate_limit_retries + 1):
+        rate_limiter.acquire(provider, estimated)
+        try:
+            content, usage = send()
+        except Exception as e:
+            if is_rate_limit_error(e) and attempt < settings.llm_rate_limit_retries:
+                rate_limiter.report_rate_limited(provider, retry_after_seconds(e))
+                note_retry()
+                continue
+            raise
+        rate_limiter.report_success(provider)
+        note_usage(provider, *usage)
+        used_tokens = sum(usage)
+        if used_tokens:
+            rate_limiter.adjust(provider, used_tokens - estimated)
+        return content
+
+
+def _openai_request(prompt: str) -> dict:
+    return dict(
         model=settings.llm_model,
         messages=[
             {"role": "user", "content": prompt}
@@ -29,17 +219,208 @@ def call_llm(prompt: str, schema: dict) -> dict:
         response_format={"type": "json_object"},
         max_completion_tokens=8000
     )
-        print(f"Full response: {response}")
-        content = response.choices[0].message.content.strip()
-        return parse_response(content)
-    except Exception as e:
-        print(f"Open AI failed:{str(e)}")
-        print(f"---Switching  to Gemini backup ({settings.gemini_model})")
+
+
+def _openai_content(response):
+    print(f"Full response: {response}")
+    usage = getattr(response, "usage", None)
+    tokens = (getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0)
+    return response.choices[0].message.content.strip(), tokens
+
+
+def _gemini_model():
+    return genai.GenerativeModel(model_name=settings.gemini_model,generation_config={'response_mime_type':'application/json'})
+
+
+def _gemini_prompt(prompt: str, schema: dict) -> str:
+    return f'{prompt}\n\nReturn JSON response matching this schema:{json.dumps(schema)}'
+
+
+def _gemini_content(response):
+    usage = getattr(response, "usage_metadata", None)
+    tokens = (getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "candidates_token_count", 0) or 0)
+    return response.text, tokens
+
+
+def _call_openai(prompt: str, schema: dict) -> dict:
+    print(f"Using model: {settings.llm_model}")
+    print(f"API key exists: {bool(settings.openai_api_key)}")
+
+    def send():
+        return _openai_content(client.chat.completions.create(**_openai_request(prompt)))
+
+    return parse_response(_with_rate_limit("openai", prompt, send))
+
+
+def _call_gemini(prompt: str, schema: dict) -> dict:
+    model = _gemini_model()
+    gemini_prompt = _gemini_prompt(prompt, schema)
+
+    def send():
+        return _gemini_content(model.generate_content(gemini_prompt))
+
+    return parse_response(_with_rate_limit("gemini", gemini_prompt, send))
+
+
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _concurrency_limit() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+async def call_llm_async(prompt: str, schema: dict, use_cache: bool = True, context: str = "") -> dict:
+    """Async counterpart of call_llm; at most llm_max_concurrency calls run upstream at once per event loop."""
+    with track_llm_call(context):
+        use_cache = use_cache and settings.llm_cache_enabled and not replay_active()
+        key = cache_key(prompt, schema)
+        # The cache is SQLite: keep its reads and writes off the shared event loop.
+        if use_cache:
+            cached = await asyncio.to_thread(response_cache.get, key)
+            if cached is not None:
+                print(f"LLM cache hit: {key[:12]}")
+                note_cache_hit()
+                return cached
+
+        async def fetch():
+            async with _concurrency_limit():
+                result = await _call_upstream_async(prompt, schema)
+            if use_cache and isinstance(result, dict) and "error" not in result:
+                await asyncio.to_thread(response_cache.set, key, result)
+            return result
+
+        result = copy.deepcopy(await in_flight.do_async(key, fetch))
+        if isinstance(result, dict) and "error" in result:
+            note_error()
+        return result
+
+
+@recorded("llm", key=cache_key)
+async def _call_upstream_async(prompt: str, schema: dict) -> dict:
+    if settings.llm_hedge_enabled:
+        return await _call_upstream_hedged_async(prompt, schema)
+    errors = []
+    candidates = iter(ASYNC_PROVIDERS)
+    provider = await asyncio.to_thread(_next_available, candidates)
+    while provider:
+        name, fn = provider
+        try:
+            return await _timed_async(name, fn, prompt, schema)
+        except Exception as e:
+            print(f"{name} failed:{str(e)}")
+            errors.append(f"{name}: {e}")
+        provider = await asyncio.to_thread(_next_available, candidates)
+        if provider:
+            print(f"---Switching to {provider[0]} backup")
+    return {"error": "; ".join(errors) or "all LLM providers unavailable (circuit open)"}
+
+
+async def _timed_async(provider: str, fn, prompt: str, schema: dict) -> dict:
+    breaker = get_breaker(provider)
+    started = time.monotonic()
+    try:
+        result = await fn(prompt, schema)
+    except asyncio.CancelledError:
+        breaker.release_probe()
+        raise
+    except Exception:
+        await asyncio.to_thread(breaker.record_failure)
+        note_attempt(provider, False)
+        raise
+    await asyncio.to_thread(breaker.record_success)
+    note_attempt(provider, True)
+    record_latency(provider, time.monotonic() - started)
+    return result
+
+
+async def _call_upstream_hedged_async(prompt: str, schema: dict) -> dict:
+    candidates = iter(ASYNC_PROVIDERS)
+    primary = await asyncio.to_thread(_next_available, candidates)
+    if primary is None:
+        return {"error": "all LLM providers unavailable (circuit open)"}
+    pending = {asyncio.ensure_future(_timed_async(primary[0], primary[1], prompt, schema)): primary[0]}
+    done, _ = await asyncio.wait(pending, timeout=hedge_delay(primary[0]))
+    errors = []
+    for task in done:
+        try:
+            return task.result()
+        except Exception as e:
+            print(f"{primary[0]} failed:{str(e)}")
+            errors.append(f"{primary[0]}: {e}")
+        pending.pop(task)
+    secondary = await asyncio.to_thread(_next_available, candidates)
+    if secondary:
+        print(f"---Hedging to {secondary[0]}")
+        pending[asyncio.ensure_future(_timed_async(secondary[0], secondary[1], prompt, schema))] = secondary[0]
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                provider = pending.pop(task)
+                try:
+                    return task.result()
+                except Exception as e:
+                    print(f"{provider} failed:{str(e)}")
+                    errors.append(f"{provider}: {e}")
+        return {"error": "; ".join(errors)}
+    finally:
+        for loser in pending:
+            loser.cancel()
+
+
+async def _with_rate_limit_async(provider: str, prompt: str, send):
+    estimated = estimate_tokens(prompt) + settings.llm_expected_completion_tokens
+    for attempt in range(settings.llm_rate_limit_retries + 1):
+        await rate_limiter.acquire_async(provider, estimated)
         try:
-            model=genai.GenerativeModel(model_name=settings.gemini_model,generation_config={'response_mime_type':'application/json'})
-            gemini_prompt = f'{prompt}\n\nReturn JSON response matching this schema:{json.dumps(schema)}'
-            response=model.generate_content(gemini_prompt)
-            return parse_response(response.text)
+            content, usage = await send()
         except Exception as e:
-            print(f"Gemini Backup also failed: {str(e)}")
-            return {"error": str(e)} 
\ No newline at end of file
+            if is_rate_limit_error(e) and attempt < settings.llm_rate_limit_retries:
+                await asyncio.to_thread(rate_limiter.report_rate_limited, provider, retry_after_seconds(e))
+                note_retry()
+                continue
+            raise
+        await asyncio.to_thread(rate_limiter.report_success, provider)
+        note_usage(provider, *usage)
+        used_tokens = sum(usage)
+        if used_tokens:
+            await asyncio.to_thread(rate_limiter.adjust, provider, used_tokens - estimated)
+        return content
+
+
+async def _call_openai_async(prompt: str, schema: dict) -> dict:
+    async def send():
+        return _openai_content(await async_client.chat.completions.create(**_openai_request(prompt)))
+
+    return parse_response(await _with_rate_limit_async("openai", prompt, send))
+
+
+async def _call_gemini_async(prompt: str, schema: dict) -> dict:
+    model = _gemini_model()
+    gemini_prompt = _gemini_prompt(prompt, schema)
+
+    async def send():
+        return _gemini_content(await model.generate_content_async(gemini_prompt))
+
+    return parse_response(await _with_rate_limit_async("gemini", gemini_prompt, send))
+
+
+PROVIDERS = [("openai", _call_openai), ("gemini", _call_gemini)]
+ASYNC_PROVIDERS = [("openai", _call_openai_async), ("gemini", _call_gemini_async)]
+
+
+def cache_stats() -> dict:
+    return {"enabled": settings.llm_cache_enabled, **response_cache.stats()}
+
+
+def provider_status() -> dict:
+    return breaker_status()
+
+
+def single_flight_stats() -> dict:
+    return in_flight.stats()
@@ -0,0 +1,44 @@
+from typing import Dict
+
+from app.core.config import settings
+from app.metrics import Histogram, LATENCY_BUCKETS
+
+
+class LatencyTracker(Histogram):
+    """Rolling window of successful call latencies for one provider."""
+
+    def __init__(self, window: int = 500):
+        super().__init__(LATENCY_BUCKETS, window)
+
+
+latency: Dict[str, LatencyTracker] = {"openai": LatencyTracker(), "gemini": LatencyTracker()}
+
+
+def record_latency(provider: str, seconds: float):
+    latency.setdefault(provider, LatencyTracker()).record(seconds)
+
+
+def hedge_delay(provider: str) -> float:
+    """Seconds to wait on ``provider`` before firing the backup request.
+
+    Uses the configured quantile of recent latencies once enough samples
+    exist, otherwise the static initial delay; always clamped to the
+    configured min/max.
+    """
+    tracker = latency.get(provider)
+    if tracker is None or tracker.count() < settings.llm_hedge_min_samples:
+        delay = settings.llm_hedge_initial_delay_seconds
+    else:
+        delay = tracker.quantile(settings.llm_hedge_quantile)
+    return min(max(delay, settings.llm_hedge_min_delay_seconds), settings.llm_hedge_max_delay_seconds)
+
+
+def hedging_stats() -> Dict:
+    return {
+        "enabled": settings.llm_hedge_enabled,
+        "quantile": settings.llm_hedge_quantile,
+        "providers": {
+            name: {**tracker.snapshot(), "hedge_delay": round(hedge_delay(name), 3)}
+            for name, tracker in latency.items()
+        },
+    }
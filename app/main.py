@@ -344,7 +344,9 @@ import uuid
 import logging
 from pathlib import Path
 from app.core.database import init_db
-from app.api.v1.endpoints import auth,audit,users,golden_records,dashboard,products,rules,projects,extraction,cleansing,aggregation,standardization,enrichment,hitl,publishing
+from app.archival import archival_queue
+from app.worker_pool import get_worker_pool, shutdown_worker_pool
+from app.api.v1.endpoints import auth,audit,users,golden_records,dashboard,products,rules,projects,extraction,cleansing,aggregation,standardization,enrichment,hitl,publishing,llm
 # Setup Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("api_main")
@@ -375,6 +377,7 @@ app.include_router(hitl.router, prefix=f"{settings.API_V1_STR}/hitl", tags=["hit
 # app/main.py
 
 app.include_router(publishing.router, prefix=f"{settings.API_V1_STR}/publishing", tags=["publishing"])
+app.include_router(llm.router, prefix=f"{settings.API_V1_STR}/llm", tags=["llm"])
 
 
 
@@ -392,6 +395,17 @@ os.makedirs(STATUS_DIR, exist_ok=True)
 @app.on_event("startup")
 async def on_startup():
     await init_db()
+    if settings.archival_drainer_enabled:
+        archival_queue.start()
+    if settings.worker_pool_prestart:
+        # Workers warm up in the background; the first product only waits if they are not ready yet.
+        get_worker_pool()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    archival_queue.stop()
+    shutdown_worker_pool()
 
 
 def save_batch_status(batch_id, data):
@@ -435,6 +449,7 @@ def process_batch_in_background(batch_id: str, df_dict: List[Dict]):
         mpn = row_clean.get("sku") or row_clean.get(
             "mpn") or row_clean.get("part number")
         title = row_clean.get("product title") or row_clean.get("title")
+        category = row_clean.get("category")
 
         if not mpn and not title:
             continue
@@ -442,7 +457,8 @@ def process_batch_in_background(batch_id: str, df_dict: List[Dict]):
         try:
             result = aggregate_product_safe(
                 mpn=str(mpn) if pd.notna(mpn) else None,
-                title=str(title) if pd.notna(title) else None
+                title=str(title) if pd.notna(title) else None,
+                category=str(category) if category is not None and pd.notna(category) else None,
             )
 
             source_links = result.get("golden_record", {}).get("sources", [])
@@ -461,8 +477,6 @@ def process_batch_in_background(batch_id: str, df_dict: List[Dict]):
             }
             final_output.append(excel_row)
 
-            time.sleep(10)
-
         except Exception as e:
             logger.error(f"Row failed for {mpn}: {e}")
 
@@ -605,8 +619,8 @@ def override_item(product_key: str, attribute: str, new_value: str, reviewer: st
 
 
 @app.post("/aggregate")
-def aggregate(mpn: str = None, upc: str = None, title: str = None):
-    return aggregate_product_safe(mpn=mpn, upc=upc, title=title)
+def aggregate(mpn: str = None, upc: str = None, title: str = None, category: str = None):
+    return aggregate_product_safe(mpn=mpn, upc=upc, title=title, category=category)
 
 
 @app.post('/hitl/reject')
@@ -0,0 +1,361 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# Upper bounds of the histogram buckets.
+LATENCY_BUCKETS = [0.5, 1, 2, 4, 8, 15, 30, 60, 120]
+TOKEN_BUCKETS = [100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000]
+COST_BUCKETS = [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5]
+
+
+class Histogram:
+    """Fixed-bucket histogram plus a rolling window of raw samples for quantiles."""
+
+    def __init__(self, buckets: List[float], window: int = 500):
+        self.buckets = buckets
+        self._samples = deque(maxlen=window)
+        self._counts = [0] * (len(buckets) + 1)
+        self._total = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, value: float):
+        with self._lock:
+            self._samples.append(value)
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._total += 1
+            self._sum += value
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, max(0, int(round(q * (len(samples) - 1)))))
+        return samples[index]
+
+    def count(self) -> int:
+        return len(self._samples)
+
+    def histogram(self) -> List[Dict]:
+        with self._lock:
+            counts = list(self._counts)
+        bounds = [str(b) for b in self.buckets] + ["+Inf"]
+        return [{"le": le, "count": c} for le, c in zip(bounds, counts)]
+
+    def snapshot(self, digits: int = 3) -> Dict:
+        return {
+            "samples": self.count(),
+            "count": self._total,
+            "sum": round(self._sum, digits),
+            "p50": round(self.quantile(0.5), digits),
+            "p95": round(self.quantile(0.95), digits),
+            "p99": round(self.quantile(0.99), digits),
+            "histogram": self.histogram(),
+        }
+
+
+def context_label(context: str) -> str:
+    """Collapse per-attribute contexts (standardize_<attr>, aggregate_<attr>) into one series."""
+    context = context or "unknown"
+    for family in ("standardize_", "aggregate_"):
+        if context.startswith(family) and context != "standardize_batch":
+            return f"{family}<attr>"
+    return context
+
+
+def call_cost(provider: str, prompt_tokens: int, completion_tokens: int) -> float:
+    input_price = getattr(settings, f"{provider}_input_cost_per_million", 0.0)
+    output_price = getattr(settings, f"{provider}_output_cost_per_million", 0.0)
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+class CallRecord:
+    """What one call_llm invocation did: providers tried, retries, tokens and wall time."""
+
+    def __init__(self, context: str):
+        self.context = context
+        self.attempts: List[Tuple[str, bool]] = []
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.cache_hit = False
+        self.wall_seconds = 0.0
+        self.error = False
+        self._lock = threading.Lock()
+
+    @property
+    def provider(self) -> Optional[str]:
+        succeeded = [name for name, ok in self.attempts if ok]
+        return succeeded[-1] if succeeded else None
+
+    @property
+    def source(self) -> str:
+        if self.cache_hit:
+            return "cache"
+        return "upstream" if self.attempts else "coalesced"
+
+    def as_dict(self) -> Dict:
+        provider = self.provider
+        return {
+            "context": self.context,
+            "provider": provider,
+            "model": settings.llm_model if provider == "openai" else settings.gemini_model if provider else None,
+            "source": self.source,
+            "wall_seconds": round(self.wall_seconds, 3),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost, 6),
+            "retries": self.retries,
+            "path": [f"{name}:{'ok' if ok else 'failed'}" for name, ok in self.attempts],
+            "error": self.error,
+        }
+
+
+class RequestMetrics:
+    """LLM calls and stage timings collected while one aggregate_product request runs."""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.calls: List[Dict] = []
+        self.stages: Dict[str, Dict] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add_call(self, call: Dict):
+        with self._lock:
+            self.calls.append(call)
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] = round(entry["seconds"] + seconds, 3)
+
+    def add_count(self, name: str, n: int):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> Dict:
+        with self._lock:
+            calls = list(self.calls)
+            stages = {name: dict(entry) for name, entry in self.stages.items()}
+            counters = dict(self.counters)
+        by_context: Dict[str, Dict] = {}
+        for call in calls:
+            entry = by_context.setdefault(
+                context_label(call["context"]),
+                {"calls": 0, "wall_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0},
+            )
+            entry["calls"] += 1
+            entry["wall_seconds"] = round(entry["wall_seconds"] + call["wall_seconds"], 3)
+            entry["prompt_tokens"] += call["prompt_tokens"]
+            entry["completion_tokens"] += call["completion_tokens"]
+            entry["cost_usd"] = round(entry["cost_usd"] + call["cost_usd"], 6)
+        return {
+            "request_id": self.request_id,
+            "stages": stages,
+            "counters": counters,
+            "llm": {
+                "call_count": len(calls),
+                "cache_hits": sum(1 for c in calls if c["source"] == "cache"),
+                "retries": sum(c["retries"] for c in calls),
+                "fallbacks": sum(1 for c in calls if len(c["path"]) > 1),
+                "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+                "completion_tokens": sum(c["completion_tokens"] for c in calls),
+                "cost_usd": round(sum(c["cost_usd"] for c in calls), 6),
+                "by_context": by_context,
+                "calls": calls,
+            },
+        }
+
+
+_current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request", default=None)
+_current_call: ContextVar[Optional[CallRecord]] = ContextVar("current_llm_call", default=None)
+
+
+class _Series:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.prompt_tokens = Histogram(TOKEN_BUCKETS)
+        self.completion_tokens = Histogram(TOKEN_BUCKETS)
+        self.cost = Histogram(COST_BUCKETS)
+        self.calls = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.fallbacks = 0
+        self.errors = 0
+
+
+_lock = threading.Lock()
+_llm_series: Dict[Tuple[str, str], _Series] = {}
+_stage_latency: Dict[str, Histogram] = {}
+_counters: Dict[str, int] = {}
+
+
+def _observe_call(call: Dict):
+    key = (context_label(call["context"]), call["provider"] or call["source"])
+    with _lock:
+        series = _llm_series.get(key)
+        if series is None:
+            series = _llm_series[key] = _Series()
+        series.calls += 1
+        series.cache_hits += call["source"] == "cache"
+        series.coalesced += call["source"] == "coalesced"
+        series.retries += call["retries"]
+        series.fallbacks += len(call["path"]) > 1
+        series.errors += bool(call["error"])
+    series.latency.record(call["wall_seconds"])
+    if call["source"] == "upstream":
+        series.prompt_tokens.record(call["prompt_tokens"])
+        series.completion_tokens.record(call["completion_tokens"])
+        series.cost.record(call["cost_usd"])
+
+
+def _observe_stage(stage: str, seconds: float):
+    with _lock:
+        histogram = _stage_latency.get(stage)
+        if histogram is None:
+            histogram = _stage_latency[stage] = Histogram(LATENCY_BUCKETS)
+    histogram.record(seconds)
+
+
+@contextmanager
+def track_request(request_id: str):
+    """Collect every LLM call and stage timing made (in this context) while the block runs."""
+    request = RequestMetrics(request_id)
+    token = _current_request.set(request)
+    try:
+        yield request
+    finally:
+        _current_request.reset(token)
+
+
+@contextmanager
+def track_llm_call(context: str):
+    call = CallRecord(context)
+    token = _current_call.set(call)
+    started = time.monotonic()
+    try:
+        yield call
+    finally:
+        call.wall_seconds = time.monotonic() - started
+        _current_call.reset(token)
+        record = call.as_dict()
+        _observe_call(record)
+        request = _current_request.get()
+        if request is not None:
+            request.add_call(record)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        seconds = time.monotonic() - started
+        _observe_stage(stage, seconds)
+        request = _current_request.get()
+        if request is not None:
+            request.add_stage(stage, seconds)
+
+
+def _add_count(name: str, n: int):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def incr(name: str, n: int = 1):
+    """Bump a process-wide counter (and the current request's copy of it)."""
+    _add_count(name, n)
+    request = _current_request.get()
+    if request is not None:
+        request.add_count(name, n)
+
+
+def counter(name: str) -> int:
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def _with_call(update):
+    call = _current_call.get()
+    if call is not None:
+        with call._lock:
+            update(call)
+
+
+def note_cache_hit():
+    _with_call(lambda call: setattr(call, "cache_hit", True))
+
+
+def note_attempt(provider: str, ok: bool):
+    _with_call(lambda call: call.attempts.append((provider, ok)))
+
+
+def note_retry():
+    def update(call):
+        call.retries += 1
+    _with_call(update)
+
+
+def note_usage(provider: str, prompt_tokens: int, completion_tokens: int):
+    def update(call):
+        call.prompt_tokens += prompt_tokens or 0
+        call.completion_tokens += completion_tokens or 0
+        call.cost += call_cost(provider, prompt_tokens or 0, completion_tokens or 0)
+    _with_call(update)
+
+
+def note_error():
+    _with_call(lambda call: setattr(call, "error", True))
+
+
+def ingest(summary: Optional[Dict]):
+    """Fold a request summary produced in a worker process into this process' histograms."""
+    if not summary:
+        return
+    for call in summary.get("llm", {}).get("calls", []):
+        _observe_call(call)
+    for name, n in summary.get("counters", {}).items():
+        _add_count(name, n)
+    for stage, entry in summary.get("stages", {}).items():
+        if entry.get("count"):
+            # Only the per-request total survives the process boundary; spread it evenly.
+            for _ in range(entry["count"]):
+                _observe_stage(stage, entry["seconds"] / entry["count"])
+
+
+def metrics_snapshot() -> Dict:
+    with _lock:
+        series = dict(_llm_series)
+        stages = dict(_stage_latency)
+        counters = dict(_counters)
+    llm = {}
+    for (context, provider), s in sorted(series.items()):
+        llm.setdefault(context, {})[provider] = {
+            "calls": s.calls,
+            "cache_hits": s.cache_hits,
+            "coalesced": s.coalesced,
+            "retries": s.retries,
+            "fallbacks": s.fallbacks,
+            "errors": s.errors,
+            "wall_seconds": s.latency.snapshot(),
+            "prompt_tokens": s.prompt_tokens.snapshot(0),
+            "completion_tokens": s.completion_tokens.snapshot(0),
+            "cost_usd": s.cost.snapshot(6),
+        }
+    return {
+        "llm": llm,
+        "stages": {name: histogram.snapshot() for name, histogram in sorted(stages.items())},
+        "counters": counters,
+    }
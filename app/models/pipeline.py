@@ -40,6 +40,14 @@ class BusinessRule(UUIDModel, table=True):
     rule_config: Dict = Field(default={}, sa_column=Column(JSON))
     active: bool = Field(default=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class AttributeSynonym(UUIDModel, table=True):
+    __tablename__ = 'attribute_synonyms'
+    normalized_name: str = Field(index=True, unique=True)
+    raw_name: str
+    canonical_name: str = Field(index=True)
+    confidence: float = Field(default=1.0)
+    origin: str = Field(default='llm')
     
 class Source(UUIDModel,table=True):
     __tablename__='sources'
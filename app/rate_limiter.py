@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Token-bucket limiter shared across processes through a SQLite file.
+
+    Each named limit (e.g. ``openai`` requests and ``openai`` tokens) is a
+    row refilled continuously at ``capacity / 60`` per second. Reservations
+    run inside ``BEGIN IMMEDIATE`` so concurrent workers never overspend.
+    A 429 from the provider blocks the limit for an exponentially growing
+    cool-off that resets on the next success.
+    """
+
+    def __init__(self, path: str, limits: Dict[str, Dict[str, int]]):
+        self.path = Path(path)
+        self.limits = limits
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " name TEXT PRIMARY KEY,"
+                " tokens REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " blocked_until REAL NOT NULL DEFAULT 0,"
+                " backoff REAL NOT NULL DEFAULT 0)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _load(self, conn: sqlite3.Connection, name: str, capacity: float, now: float):
+        row = conn.execute(
+            "SELECT tokens, updated_at, blocked_until, backoff FROM buckets WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            conn.execute("INSERT INTO buckets(name, tokens, updated_at) VALUES(?, ?, ?)", (name, capacity, now))
+            return capacity, 0.0, 0.0
+        tokens, updated_at, blocked_until, backoff = row
+        tokens = min(capacity, tokens + (now - updated_at) * capacity / 60.0)
+        return tokens, blocked_until, backoff
+
+    def try_acquire(self, provider: str, tokens: int = 0) -> float:
+        """Reserve one request and ``tokens`` tokens; return 0 or seconds to wait."""
+        limits = self.limits.get(provider)
+        if not limits:
+            return 0.0
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            wanted = {
+                f"{provider}:requests": (float(limits["rpm"]), 1.0),
+                f"{provider}:tokens": (float(limits["tpm"]), float(min(tokens, limits["tpm"]))),
+            }
+            state = {name: self._load(conn, name, cap, now) for name, (cap, _) in wanted.items()}
+            wait = 0.0
+            for name, (cap, need) in wanted.items():
+                available, blocked_until, _ = state[name]
+                wait = max(wait, blocked_until - now)
+                if available < need:
+                    wait = max(wait, (need - available) * 60.0 / cap)
+            if wait <= 0:
+                for name, (cap, need) in wanted.items():
+                    conn.execute(
+                        "UPDATE buckets SET tokens = ?, updated_at = ? WHERE name = ?",
+                        (state[name][0] - need, now, name),
+                    )
+            conn.execute("COMMIT")
+            return max(wait, 0.0)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def acquire(self, provider: str, tokens: int = 0):
+        while True:
+            try:
+                wait = self.try_acquire(provider, tokens)
+            except sqlite3.Error as e:
+                logger.warning(f"Rate limiter unavailable, continuing without it: {e}")
+                return
+            if wait <= 0:
+                return
+            logger.info(f"Rate limit reached for {provider}, waiting {wait:.2f}s")
+            time.sleep(min(wait, 5.0))
+
+    async def acquire_async(self, provider: str, tokens: int = 0):
+        while True:
+            try:
+                # BEGIN IMMEDIATE can wait on other processes; never on the event loop.
+                wait = await asyncio.to_thread(self.try_acquire, provider, tokens)
+            except sqlite3.Error as e:
+                logger.warning(f"Rate limiter unavailable, continuing without it: {e}")
+                return
+            if wait <= 0:
+                return
+            logger.info(f"Rate limit reached for {provider}, waiting {wait:.2f}s")
+            await asyncio.sleep(min(wait, 5.0))
+
+    def adjust(self, provider: str, tokens: int):
+        """Charge (or refund, if negative) the difference between estimated and actual tokens."""
+        if provider not in self.limits or not tokens:
+            return
+        try:
+            self._connect().execute(
+                "UPDATE buckets SET tokens = tokens - ? WHERE name = ?", (tokens, f"{provider}:tokens")
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Rate limiter adjust failed: {e}")
+
+    def report_rate_limited(self, provider: str, retry_after: Optional[float] = None) -> float:
+        """Block ``provider`` after a 429 and return the cool-off applied."""
+        name = f"{provider}:requests"
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                cap = float(self.limits.get(provider, {}).get("rpm", 60))
+                self._load(conn, name, cap, now)
+                (backoff,) = conn.execute("SELECT backoff FROM buckets WHERE name = ?", (name,)).fetchone()
+                backoff = min(max(backoff * 2, settings.llm_rate_limit_backoff_seconds),
+                              settings.llm_rate_limit_max_backoff_seconds)
+                delay = max(retry_after or 0.0, backoff)
+                conn.execute(
+                    "UPDATE buckets SET tokens = 0, updated_at = ?, blocked_until = ?, backoff = ? WHERE name = ?",
+                    (now, now + delay, backoff, name),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            logger.warning(f"{provider} returned 429, backing off {delay:.1f}s")
+            return delay
+        except sqlite3.Error as e:
+            logger.warning(f"Rate limiter backoff failed: {e}")
+            return 0.0
+
+    def report_success(self, provider: str):
+        try:
+            self._connect().execute(
+                "UPDATE buckets SET backoff = 0 WHERE name = ? AND backoff > 0", (f"{provider}:requests",)
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Rate limiter reset failed: {e}")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def is_rate_limit_error(e: Exception) -> bool:
+    if getattr(e, "status_code", None) == 429 or getattr(e, "code", None) == 429:
+        return True
+    return type(e).__name__ in ("RateLimitError", "ResourceExhausted") or "429" in str(e)
+
+
+def retry_after_seconds(e: Exception) -> Optional[float]:
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+rate_limiter = RateLimiter(
+    settings.llm_rate_limit_path,
+    {
+        "openai": {"rpm": settings.openai_requests_per_minute, "tpm": settings.openai_tokens_per_minute},
+        "gemini": {"rpm": settings.gemini_requests_per_minute, "tpm": settings.gemini_tokens_per_minute},
+    },
+)
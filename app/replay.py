@@ -0,0 +1,248 @@
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.disk_cache import make_key
+
+logger = logging.getLogger("aggregation_engine")
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+
+class ReplayMissError(LookupError):
+    """Replay mode found no recording for an external call."""
+
+
+class ReplayedError(RuntimeError):
+    """An exception that was raised (and recorded) during the original run."""
+
+
+def mode() -> str:
+    return (settings.replay_mode or OFF).lower()
+
+
+def active() -> bool:
+    return mode() in (RECORD, REPLAY)
+
+
+def _archive() -> Path:
+    return Path(settings.replay_archive_path)
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _encode(value: Any) -> Any:
+    """JSON-safe form of a call result; bytes and files go to content-addressed blobs."""
+    if isinstance(value, bytes):
+        digest = hashlib.sha256(value).hexdigest()
+        blob = _archive() / "blobs" / digest
+        if not blob.exists():
+            _write_atomic(blob, value)
+        return {"__blob__": digest}
+    if isinstance(value, Path):
+        # Replayed as the path of the archived copy.
+        return {"__file__": _encode(value.read_bytes())["__blob__"]}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _encode(v) for k, v in value.items()}
+    return value
+
+
+def _decode(value: Any) -> Any:
+    if isinstance(value, dict):
+        if set(value) == {"__blob__"}:
+            return (_archive() / "blobs" / value["__blob__"]).read_bytes()
+        if set(value) == {"__file__"}:
+            return _archive() / "blobs" / value["__file__"]
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+def _key_part(value: Any) -> Any:
+    if isinstance(value, bytes):
+        return hashlib.sha256(value).hexdigest()
+    if isinstance(value, Path):
+        return None  # local temp paths differ between runs
+    return value
+
+
+def _call_key(kind: str, args, kwargs) -> str:
+    return make_key(kind, [_key_part(a) for a in args], {k: _key_part(v) for k, v in sorted(kwargs.items())})
+
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.kinds: Dict[str, Dict] = {}
+
+    def add(self, kind: str, outcome: str, recorded_seconds: float, injected_seconds: float = 0.0):
+        with self._lock:
+            entry = self.kinds.setdefault(
+                kind, {"recorded": 0, "replayed": 0, "misses": 0, "recorded_seconds": 0.0, "injected_seconds": 0.0}
+            )
+            entry[outcome] += 1
+            entry["recorded_seconds"] = round(entry["recorded_seconds"] + recorded_seconds, 3)
+            entry["injected_seconds"] = round(entry["injected_seconds"] + injected_seconds, 3)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"mode": mode(), "archive": str(_archive()), "kinds": {k: dict(v) for k, v in self.kinds.items()}}
+
+    def reset(self):
+        with self._lock:
+            self.kinds.clear()
+
+
+stats = _Stats()
+
+
+def _record(kind: str, key: str, duration: float, result: Any = None, error: Optional[BaseException] = None):
+    entry = {"kind": kind, "key": key, "duration": round(duration, 4), "recorded_at": time.time()}
+    if error is not None:
+        entry["error"] = {"type": type(error).__name__, "message": str(error)}
+    else:
+        entry["result"] = _encode(result)
+    _write_atomic(_archive() / kind / f"{key}.json", json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+    stats.add(kind, "recorded", duration)
+
+
+def _load(kind: str, key: str) -> Dict:
+    path = _archive() / kind / f"{key}.json"
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        stats.add(kind, "misses", 0.0)
+        raise ReplayMissError(f"No recorded {kind} interaction for key {key[:12]} in {_archive()}")
+
+
+def _injected_latency(entry: Dict) -> float:
+    return entry.get("duration", 0.0) * settings.replay_latency_scale + settings.replay_latency_seconds
+
+
+def _replayed(entry: Dict) -> Any:
+    if "error" in entry:
+        raise ReplayedError(f"{entry['error']['type']}: {entry['error']['message']}")
+    return _decode(entry.get("result"))
+
+
+def recorded(kind: str, key: Optional[Callable[..., str]] = None):
+    """Capture (record mode) or serve (replay mode) the results of an external call.
+
+    Interactions are stored as ``<archive>/<kind>/<key>.json``; bytes in the
+    result are stored once under ``<archive>/blobs``. The key is derived from
+    the call arguments unless ``key`` is given. Replay sleeps
+    ``duration * replay_latency_scale + replay_latency_seconds`` before
+    returning, so external wait can be dialled in or out of a benchmark.
+    """
+
+    def decorator(fn):
+        def call_key(args, kwargs) -> str:
+            return key(*args, **kwargs) if key else _call_key(kind, args, kwargs)
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                current = mode()
+                if current == REPLAY:
+                    entry = _load(kind, call_key(args, kwargs))
+                    delay = _injected_latency(entry)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    stats.add(kind, "replayed", entry.get("duration", 0.0), delay)
+                    return _replayed(entry)
+                if current != RECORD:
+                    return await fn(*args, **kwargs)
+                started = time.monotonic()
+                try:
+                    result = await fn(*args, **kwargs)
+                except Exception as e:
+                    _record(kind, call_key(args, kwargs), time.monotonic() - started, error=e)
+                    raise
+                _record(kind, call_key(args, kwargs), time.monotonic() - started, result)
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            current = mode()
+            if current == REPLAY:
+                entry = _load(kind, call_key(args, kwargs))
+                delay = _injected_latency(entry)
+                if delay > 0:
+                    time.sleep(delay)
+                stats.add(kind, "replayed", entry.get("duration", 0.0), delay)
+                return _replayed(entry)
+            if current != RECORD:
+                return fn(*args, **kwargs)
+            started = time.monotonic()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                _record(kind, call_key(args, kwargs), time.monotonic() - started, error=e)
+                raise
+            _record(kind, call_key(args, kwargs), time.monotonic() - started, result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def replay_stats() -> Dict:
+    return stats.snapshot()
+
+
+if __name__ == "__main__":
+    # python -m app.replay --mode replay --mpn 12345 --title "Brand Product"
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run aggregate_product against a record/replay archive")
+    parser.add_argument("--mode", choices=[RECORD, REPLAY], default=REPLAY)
+    parser.add_argument("--mpn")
+    parser.add_argument("--title")
+    parser.add_argument("--category")
+    parser.add_argument("--runs", type=int, default=1)
+    cli = parser.parse_args()
+
+    settings.replay_mode = cli.mode
+    # Run as a script this file is __main__; the pipeline records into the imported
+    # app.replay module, so its stats are the ones to read.
+    from app import replay
+    from app.aggregation import aggregate_product
+
+    for run in range(cli.runs):
+        replay.stats.reset()
+        started = time.monotonic()
+        result = aggregate_product(mpn=cli.mpn, title=cli.title, category=cli.category)
+        wall = time.monotonic() - started
+        kinds = replay.stats.snapshot()["kinds"]
+        external = sum(
+            k["injected_seconds"] if cli.mode == REPLAY else k["recorded_seconds"] for k in kinds.values()
+        )
+        print(json.dumps({
+            "run": run + 1,
+            "status": result.get("status"),
+            "wall_seconds": round(wall, 3),
+            "external_seconds": round(external, 3),
+            "stages": result.get("metrics", {}).get("stages", {}),
+            "interactions": kinds,
+        }, indent=2))
@@ -1,23 +1,44 @@
+import asyncio
 import json
 import logging
 from typing import Dict, List, Any, Optional
-from .llm import call_llm
+from .llm import call_llm, call_llm_async
+from app.core.config import settings
+from app.deterministic_extraction import extract_structured
+from app.html_condense import condense_html
+from app.standardization import SOURCE_CONFIDENCE, clean_value, extract_number_and_unit, values_are_similar
+from app.utils import attribute_key_parts, coerce_confidence, is_invalid, normalize_attribute_key
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("aggregation_engine")
 
 
-def safe_call_llm(prompt: str, schema: dict, context: str = "") -> dict:
+def _checked_llm_result(result, context: str) -> dict:
+    if not isinstance(result, dict):
+        logger.error(f"LLM returned non-dict in {context}: {result}")
+        return {"error": "invalid_response", "raw": str(result)}
+    return result
+
+
+def safe_call_llm(prompt: str, schema: dict, context: str = "", use_cache: bool = True) -> dict:
     if not prompt.strip():
         logger.warning(f"Empty prompt in {context}")
         return {"error": "empty_prompt", "context": context}
 
     try:
-        result = call_llm(prompt, schema)
-        if not isinstance(result, dict):
-            logger.error(f"LLM returned non-dict in {context}: {result}")
-            return {"error": "invalid_response", "raw": str(result)}
-        return result
+        return _checked_llm_result(call_llm(prompt, schema, use_cache=use_cache, context=context), context)
+    except Exception as e:
+        logger.error(f"LLM FAILED in {context}: {e}")
+        return {"error": "llm_exception", "details": str(e)}
+
+
+async def safe_call_llm_async(prompt: str, schema: dict, context: str = "", use_cache: bool = True) -> dict:
+    if not prompt.strip():
+        logger.warning(f"Empty prompt in {context}")
+        return {"error": "empty_prompt", "context": context}
+
+    try:
+        return _checked_llm_result(await call_llm_async(prompt, schema, use_cache=use_cache, context=context), context)
     except Exception as e:
         logger.error(f"LLM FAILED in {context}: {e}")
         return {"error": "llm_exception", "details": str(e)}
@@ -139,36 +160,89 @@ def fallback_extraction(html: str) -> Dict:
     except Exception as e:
         logger.error(f"Fallback extraction error: {e}")
         return {}
+def _empty_web_result() -> Dict:
+    logger.warning("Web HTML too short or empty")
+    return {"source": "web", "attributes": {}, "error": "empty_html"}
+
+
+def _fallback_web_result(html: str) -> Dict:
+    return {
+        "source": "web",
+        "attributes": fallback_extraction(html),
+        "extraction_method": "fallback"
+    }
+
+
+def _deterministic_web_result(html: str, sku: str) -> Optional[Dict]:
+    """Structured-data tier; returns a result only when it scores above deterministic_min_score."""
+    structured = extract_structured(html)
+    logger.info(
+        f"Deterministic extraction for {sku}: {len(structured['attributes'])} attributes, "
+        f"score={structured['score']} {structured['strategies']}"
+    )
+    if structured["score"] < settings.deterministic_min_score:
+        return None
+    return {
+        "source": "web",
+        "attributes": structured["attributes"],
+        "extraction_method": "deterministic",
+        "extraction_score": structured["score"],
+    }
+
+
+def _tag_llm_result(result: Dict) -> Dict:
+    result.setdefault("extraction_method", "llm")
+    return result
+
+
 def extract_from_web(html: str, sku: str = "") -> Dict:
-    """Two-pass extraction: discover schema, then extract"""
+    """Deterministic tier first (per extraction_policy), then two-pass LLM extraction: discover schema, then extract"""
     if not html or len(html.strip()) < 100:
-        logger.warning("Web HTML too short or empty")
-        return {"source": "web", "attributes": {}, "error": "empty_html"}
+        return _empty_web_result()
+
+    if settings.extraction_policy == "deterministic_first":
+        structured = _deterministic_web_result(html, sku)
+        if structured:
+            return structured
 
     # PASS 1: Schema Discovery
     discovery_result = discover_attributes(html, sku)
     
     if not discovery_result or not discovery_result.get("found_attributes"):
         logger.warning(f"No attributes discovered for {sku}, using fallback")
-        return {
-            "source": "web",
-            "attributes": fallback_extraction(html),
-            "extraction_method": "fallback"
-        }
+        return _fallback_web_result(html)
     
     # PASS 2: Targeted Extraction
-    extraction_result = extract_discovered_attributes(
+    return _tag_llm_result(extract_discovered_attributes(
         html, 
         discovery_result["found_attributes"],
         sku
-    )
-    
-    return extraction_result
+    ))
 
 
-def discover_attributes(html: str, sku: str = "") -> Dict:
-    """Pass 1: Discover what attributes exist in the HTML"""
-    
+async def extract_from_web_async(html: str, sku: str = "") -> Dict:
+    if not html or len(html.strip()) < 100:
+        return _empty_web_result()
+
+    if settings.extraction_policy == "deterministic_first":
+        structured = await asyncio.to_thread(_deterministic_web_result, html, sku)
+        if structured:
+            return structured
+
+    discovery_result = await discover_attributes_async(html, sku)
+
+    if not discovery_result or not discovery_result.get("found_attributes"):
+        logger.warning(f"No attributes discovered for {sku}, using fallback")
+        return await asyncio.to_thread(_fallback_web_result, html)
+
+    return _tag_llm_result(await extract_discovered_attributes_async(
+        html,
+        discovery_result["found_attributes"],
+        sku
+    ))
+
+
+def _discover_attributes_request(html: str):
     prompt = f"""
 You are analyzing an HTML product page to discover what technical specifications exist.
 
@@ -180,8 +254,8 @@ Your job: Identify ALL attribute names/labels that appear in the HTML, especiall
 
 Do NOT extract values yet - only find the attribute NAMES.
 
-HTML (first 10000 chars):
-{html[:10000]}
+HTML (boilerplate removed, spec-dense regions only):
+{condense_html(html, settings.llm_discover_html_tokens)}
 
 Output ONLY JSON:
 {{
@@ -203,7 +277,12 @@ Examples of attribute names: "Battery Capacity", "Weight", "Material", "Color",
         },
         "required": ["found_attributes"]
     }
-    
+    return prompt, schema
+
+
+def discover_attributes(html: str, sku: str = "") -> Dict:
+    """Pass 1: Discover what attributes exist in the HTML"""
+    prompt, schema = _discover_attributes_request(html)
     try:
         result = safe_call_llm(prompt, schema, "discover_attributes")
         logger.info(f"Discovered {len(result.get('found_attributes', []))} attributes for {sku}: {result.get('product_type_hint', 'unknown')}")
@@ -213,12 +292,19 @@ Examples of attribute names: "Battery Capacity", "Weight", "Material", "Color",
         return {"found_attributes": [], "error": str(e)}
 
 
-def extract_discovered_attributes(html: str, attribute_names: list, sku: str = "") -> Dict:
-    """Pass 2: Extract specific attributes discovered in pass 1"""
-    
-    if not attribute_names:
-        return {"source": "web", "attributes": {}, "error": "no_attributes_discovered"}
-    
+async def discover_attributes_async(html: str, sku: str = "") -> Dict:
+    # condense_html parses the whole page; keep it off the shared event loop.
+    prompt, schema = await asyncio.to_thread(_discover_attributes_request, html)
+    try:
+        result = await safe_call_llm_async(prompt, schema, "discover_attributes")
+        logger.info(f"Discovered {len(result.get('found_attributes', []))} attributes for {sku}: {result.get('product_type_hint', 'unknown')}")
+        return result
+    except Exception as e:
+        logger.error(f"Schema discovery failed for {sku}: {e}")
+        return {"found_attributes": [], "error": str(e)}
+
+
+def _extract_discovered_request(html: str, attribute_names: list):
     prompt = f"""
 You are extracting specific technical specifications from HTML.
 
@@ -231,8 +317,8 @@ Rules:
 - If an attribute is not found, omit it (don't include null values)
 - Look in tables, lists, divs, and any structured data
 
-HTML (first 15000 chars):
-{html[:15000]}
+HTML (boilerplate removed, spec-dense regions only):
+{condense_html(html, settings.llm_extract_html_tokens)}
 
 Output ONLY JSON: {{"source": "web", "attributes": {{"Attribute Name": "value"}}}}
 """
@@ -245,38 +331,58 @@ Output ONLY JSON: {{"source": "web", "attributes": {{"Attribute Name": "value"}}
         },
         "required": ["source", "attributes"]
     }
+    return prompt, schema
+
+
+def _finish_discovered_extraction(result: Dict, html: str, sku: str) -> Dict:
+    # Validate we got real data
+    if not result or "attributes" not in result:
+        logger.warning(f"Extraction failed for {sku}")
+        return {"source": "web", "attributes": {}, "error": "extraction_failed"}
+    
+    # Check if all values are null/empty
+    attrs = result["attributes"]
+    if not attrs or all(v is None or v == "" for v in attrs.values()):
+        logger.warning(f"All extracted values are null/empty for {sku}, trying fallback")
+        return _fallback_web_result(html)
+    
+    # Filter out null values
+    result["attributes"] = {k: v for k, v in attrs.items() if v is not None and v != ""}
+    logger.info(f"Successfully extracted {len(result['attributes'])} attributes for {sku}")
+    
+    return result
+
+
+def extract_discovered_attributes(html: str, attribute_names: list, sku: str = "") -> Dict:
+    """Pass 2: Extract specific attributes discovered in pass 1"""
+    
+    if not attribute_names:
+        return {"source": "web", "attributes": {}, "error": "no_attributes_discovered"}
     
+    prompt, schema = _extract_discovered_request(html, attribute_names)
     try:
         result = safe_call_llm(prompt, schema, "extract_discovered_attributes")
-        
-        # Validate we got real data
-        if not result or "attributes" not in result:
-            logger.warning(f"Extraction failed for {sku}")
-            return {"source": "web", "attributes": {}, "error": "extraction_failed"}
-        
-        # Check if all values are null/empty
-        attrs = result["attributes"]
-        if not attrs or all(v is None or v == "" for v in attrs.values()):
-            logger.warning(f"All extracted values are null/empty for {sku}, trying fallback")
-            return {
-                "source": "web",
-                "attributes": fallback_extraction(html),
-                "extraction_method": "fallback"
-            }
-        
-        # Filter out null values
-        result["attributes"] = {k: v for k, v in attrs.items() if v is not None and v != ""}
-        logger.info(f"Successfully extracted {len(result['attributes'])} attributes for {sku}")
-        
-        return result
-        
+        return _finish_discovered_extraction(result, html, sku)
     except Exception as e:
         logger.exception(f"Attribute extraction failed for {sku}: {e}")
         return {"source": "web", "attributes": {}, "error": str(e)}
-def extract_from_pdf(text: str) -> Dict:
-    if not text.strip():
-        return {"source": "pdf", "attributes": {}, "error": "empty_pdf"}
 
+
+async def extract_discovered_attributes_async(html: str, attribute_names: list, sku: str = "") -> Dict:
+    if not attribute_names:
+        return {"source": "web", "attributes": {}, "error": "no_attributes_discovered"}
+
+    prompt, schema = await asyncio.to_thread(_extract_discovered_request, html, attribute_names)
+    try:
+        result = await safe_call_llm_async(prompt, schema, "extract_discovered_attributes")
+        # May fall back to parsing the whole page.
+        return await asyncio.to_thread(_finish_discovered_extraction, result, html, sku)
+    except Exception as e:
+        logger.exception(f"Attribute extraction failed for {sku}: {e}")
+        return {"source": "web", "attributes": {}, "error": str(e)}
+
+
+def _extract_from_pdf_request(text: str):
     prompt = f"""
 Extract technical specifications from this PDF text.
 Rules: - Extract tables, bullet specs, compliance data - Keep original wording - No assumptions
@@ -293,8 +399,23 @@ Output ONLY JSON: {{"source": "pdf", "attributes": {{"Spec Name": "Value"}}}}
         },
         "required": ["source", "attributes"]
     }
-    result = safe_call_llm(prompt, schema, "extract_from_pdf")
-    return result
+    return prompt, schema
+
+
+def extract_from_pdf(text: str) -> Dict:
+    if not text.strip():
+        return {"source": "pdf", "attributes": {}, "error": "empty_pdf"}
+
+    prompt, schema = _extract_from_pdf_request(text)
+    return safe_call_llm(prompt, schema, "extract_from_pdf")
+
+
+async def extract_from_pdf_async(text: str) -> Dict:
+    if not text.strip():
+        return {"source": "pdf", "attributes": {}, "error": "empty_pdf"}
+
+    prompt, schema = _extract_from_pdf_request(text)
+    return await safe_call_llm_async(prompt, schema, "extract_from_pdf")
 
 
 def extract_from_image(description: str) -> Dict:
@@ -360,10 +481,7 @@ Return ONLY JSON.
     return result.get(canonical, {"values": values, "conflict": True})
 
 
-def standardize_with_llm(attribute: str, values: List[str]) -> dict:
-    if not values:
-        return {"standard_value": None, "unit": None, "derived_from": []}
-
+def _standardize_request(attribute: str, values: List[str]):
     prompt = f"""
 Standardize attribute: {attribute}
 Values: {json.dumps(values)}
@@ -379,10 +497,117 @@ Output ONLY JSON.
         },
         "required": ["standard_value", "derived_from"]
     }
+    return prompt, schema
+
+
+def standardize_with_llm(attribute: str, values: List[str]) -> dict:
+    if not values:
+        return {"standard_value": None, "unit": None, "derived_from": []}
+
+    prompt, schema = _standardize_request(attribute, values)
     return safe_call_llm(prompt, schema, f"standardize_{attribute}")
 
 
-def unify_attributes(attributes: List[str]):
+async def standardize_with_llm_async(attribute: str, values: List[str]) -> dict:
+    if not values:
+        return {"standard_value": None, "unit": None, "derived_from": []}
+
+    prompt, schema = _standardize_request(attribute, values)
+    return await safe_call_llm_async(prompt, schema, f"standardize_{attribute}")
+
+
+def _standardize_batch_request(attribute_values: Dict[str, List[str]]):
+    prompt = f"""
+Standardize each attribute below independently.
+Attributes (name -> raw values):
+{json.dumps(attribute_values, indent=2, ensure_ascii=False)}
+Rules: Convert units, enforce enums, pick one truth per attribute.
+Return every attribute listed above exactly once, keyed by the same name.
+Output ONLY JSON:
+{{
+  "attributes": {{
+    "attribute_name": {{"standard_value": "value", "unit": "unit or null", "derived_from": ["raw value", ...]}}
+  }}
+}}
+"""
+    schema = {
+        "type": "object",
+        "properties": {
+            "attributes": {
+                "type": "object",
+                "additionalProperties": {
+                    "type": "object",
+                    "properties": {
+                        "standard_value": {},
+                        "unit": {"type": ["string", "null"]},
+                        "derived_from": {"type": "array"}
+                    },
+                    "required": ["standard_value", "derived_from"]
+                }
+            }
+        },
+        "required": ["attributes"]
+    }
+    return prompt, schema
+
+
+def _chunk_attribute_values(attribute_values: Dict[str, List[str]], chunk_size: Optional[int]) -> List[Dict[str, List[str]]]:
+    chunk_size = max(1, chunk_size or settings.llm_standardize_chunk_size)
+    items = [(k, v) for k, v in attribute_values.items() if v]
+    return [dict(items[i:i + chunk_size]) for i in range(0, len(items), chunk_size)]
+
+
+def _split_batch_result(result: Dict, chunk: Dict[str, List[str]]):
+    """Return (standardized, missing) for one chunk's batch response."""
+    attrs = result.get("attributes") if isinstance(result, dict) and "error" not in result else None
+    if not isinstance(attrs, dict):
+        return {}, list(chunk)
+    standardized = {}
+    missing = []
+    for attribute in chunk:
+        entry = attrs.get(attribute)
+        if isinstance(entry, dict) and "standard_value" in entry:
+            entry.setdefault("unit", None)
+            entry.setdefault("derived_from", [])
+            standardized[attribute] = entry
+        else:
+            missing.append(attribute)
+    return standardized, missing
+
+
+def standardize_batch_with_llm(attribute_values: Dict[str, List[str]], chunk_size: Optional[int] = None) -> Dict[str, dict]:
+    """Standardize many attributes per LLM call; attributes a chunk fails to return fall back to standardize_with_llm."""
+    standardized = {}
+    for chunk in _chunk_attribute_values(attribute_values, chunk_size):
+        prompt, schema = _standardize_batch_request(chunk)
+        done, missing = _split_batch_result(safe_call_llm(prompt, schema, "standardize_batch"), chunk)
+        if missing:
+            logger.warning(f"Batch standardization missed {len(missing)}/{len(chunk)} attributes, retrying individually")
+        for attribute in missing:
+            done[attribute] = standardize_with_llm(attribute, chunk[attribute])
+        standardized.update(done)
+    return standardized
+
+
+async def _standardize_chunk_async(chunk: Dict[str, List[str]]) -> Dict[str, dict]:
+    prompt, schema = _standardize_batch_request(chunk)
+    done, missing = _split_batch_result(await safe_call_llm_async(prompt, schema, "standardize_batch"), chunk)
+    if missing:
+        logger.warning(f"Batch standardization missed {len(missing)}/{len(chunk)} attributes, retrying individually")
+        fallback = await asyncio.gather(*(standardize_with_llm_async(a, chunk[a]) for a in missing))
+        done.update(zip(missing, fallback))
+    return done
+
+
+async def standardize_batch_with_llm_async(attribute_values: Dict[str, List[str]], chunk_size: Optional[int] = None) -> Dict[str, dict]:
+    standardized = {}
+    chunks = _chunk_attribute_values(attribute_values, chunk_size)
+    for done in await asyncio.gather(*(_standardize_chunk_async(chunk) for chunk in chunks)):
+        standardized.update(done)
+    return standardized
+
+
+def _unify_request(attributes: List[str]):
     prompt = f"""
 You are a semantic attribute harmonization engine.
 Raw attribute names from multiple sources:
@@ -429,9 +654,103 @@ Example output:
             "required": ["canonical_attributes"]
         }
     }
+    return prompt, schema
 
-    result = call_llm(prompt, schema)
-    return result
+
+def _unify_blocks(attributes: List[str], chunk_size: Optional[int] = None) -> List[List[str]]:
+    """Split names into blocks of at most chunk_size, keeping names with the same head word together.
+
+    "Weight", "Item Weight" and "Net Weight" share the head word "weight", so
+    they land in one block and the LLM can still group them.
+    """
+    chunk_size = max(1, chunk_size or settings.unify_chunk_size)
+    if len(attributes) <= chunk_size:
+        return [list(attributes)] if attributes else []
+    clusters: Dict[str, List[str]] = {}
+    for name in attributes:
+        words = [w for w in attribute_key_parts(name)[0].split() if not w.isdigit()]
+        clusters.setdefault(words[-1] if words else str(name).lower(), []).append(name)
+    blocks: List[List[str]] = []
+    current: List[str] = []
+    for head in sorted(clusters):
+        cluster = clusters[head]
+        for i in range(0, len(cluster), chunk_size):
+            piece = cluster[i:i + chunk_size]
+            if current and len(current) + len(piece) > chunk_size:
+                blocks.append(current)
+                current = []
+            current.extend(piece)
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+def _merge_unify_results(attributes: List[str], results: List[Any]) -> Dict:
+    """Merge per-block unify mappings.
+
+    Groups with the same canonical name are merged (keeping the lower
+    confidence). A name claimed by several groups stays with the most
+    confident one. Names no block returned (errors, truncated output) become
+    single-name groups with confidence 0.5.
+    """
+    by_key = {normalize_attribute_key(name): name for name in attributes}
+    canonical_map: Dict[str, Dict] = {}
+    owner: Dict[str, str] = {}
+    errors = []
+    for result in results:
+        if not isinstance(result, dict) or "error" in result:
+            errors.append(str(result.get("error") if isinstance(result, dict) else result))
+            continue
+        for canonical, info in (result.get("canonical_attributes") or {}).items():
+            if not isinstance(info, dict):
+                continue
+            confidence = coerce_confidence(info.get("confidence"))
+            group = canonical_map.setdefault(canonical, {"synonyms": [], "confidence": confidence})
+            group["confidence"] = min(group["confidence"], confidence)
+            for synonym in info.get("synonyms", []):
+                name = by_key.get(normalize_attribute_key(synonym))
+                if name is None:
+                    continue  # not one of the names we asked about
+                previous = owner.get(name)
+                if previous == canonical:
+                    continue
+                if previous is not None:
+                    if canonical_map[previous]["confidence"] >= confidence:
+                        continue
+                    canonical_map[previous]["synonyms"].remove(name)
+                owner[name] = canonical
+                group["synonyms"].append(name)
+
+    missing = [name for name in attributes if name not in owner]
+    if missing:
+        logger.warning(f"Unification returned no group for {len(missing)}/{len(attributes)} attributes")
+    for name in missing:
+        canonical = normalize_attribute_key(name).replace(" ", "_")
+        group = canonical_map.setdefault(canonical, {"synonyms": [], "confidence": 0.5})
+        group["confidence"] = min(group["confidence"], 0.5)
+        group["synonyms"].append(name)
+
+    merged = {"canonical_attributes": {k: v for k, v in canonical_map.items() if v["synonyms"]}}
+    if errors and len(errors) == len(results):
+        merged["error"] = "; ".join(errors)
+    return merged
+
+
+def unify_attributes(attributes: List[str], chunk_size: Optional[int] = None):
+    results = []
+    for block in _unify_blocks(attributes, chunk_size):
+        prompt, schema = _unify_request(block)
+        results.append(call_llm(prompt, schema, context="unify_attributes"))
+    return _merge_unify_results(attributes, results)
+
+
+async def unify_attributes_async(attributes: List[str], chunk_size: Optional[int] = None):
+    """Unify attribute names; large sets are split into lexically clustered blocks that run concurrently."""
+    requests = [_unify_request(block) for block in _unify_blocks(attributes, chunk_size)]
+    results = await asyncio.gather(
+        *(call_llm_async(prompt, schema, context="unify_attributes") for prompt, schema in requests)
+    )
+    return _merge_unify_results(attributes, list(results))
 
 
 # def build_golden_record(standarized_data: Dict, identifiers: Dict) -> Dict:
@@ -496,9 +815,7 @@ Example output:
 #             'generated_by': 'deterministic_fallback'
 #         }
 #     return result
-def build_golden_record(standardized_data: Dict, identifiers: Dict) -> Dict:
-    """Build final golden record from standardized data"""
-    
+def _golden_record_precheck(standardized_data: Dict, identifiers: Dict) -> Optional[Dict]:
     if not identifiers or 'mpn' not in identifiers:
         logger.error("Golden record failed: missing identifiers")
         return {
@@ -518,97 +835,198 @@ def build_golden_record(standardized_data: Dict, identifiers: Dict) -> Dict:
             'ready_for_publish': False,
             'error': 'no_standardized_data'
         }
-    
-    tech_spec_count = len(standardized_data)
-    has_brand = bool(identifiers.get('brand'))
-    
-    prompt = f"""
-Create a product Golden Record and return the result as JSON.
+    return None
 
-INPUT DATA:
-SKU/MPN: {identifiers.get('mpn')}
-Brand: {identifiers.get('brand')}
 
-STANDARDIZED ATTRIBUTES:
-{json.dumps(standardized_data, indent=2)}
+# Extraction "source" -> SOURCE_CONFIDENCE key.
+SOURCE_CONFIDENCE_KEYS = {"pdf": "datasheet", "web": "web"}
 
-YOUR TASK:
-Create a clean JSON object with:
-1. Copy the SKU and brand from above
-2. Include ALL standardized attributes 
-3. Set ready_for_publish based on: has brand ({has_brand}) AND at least 4 specs ({tech_spec_count} found)
-4. Assign confidence 0.0-1.0 based on data completeness
 
-Return ONLY this JSON structure (no markdown, no extra text):
-{{
-  "sku": "the SKU value",
-  "brand": "the brand value",
-  "attributes": {{
-    "attribute_name": "value",
-    ...all attributes from STANDARDIZED ATTRIBUTES...
-  }},
-  "ready_for_publish": true or false,
-  "confidence": 0.0 to 1.0
-}}
+def _golden_value(entry: Any) -> Any:
+    """Publishable value of one standardized attribute, or None when it carries nothing usable."""
+    if not isinstance(entry, dict):
+        return None if entry is None or is_invalid(str(entry)) else entry
+    if "error" in entry:
+        return None
+    value = entry.get("standard_value")
+    if value is None or (isinstance(value, (list, dict)) and not value) or is_invalid(str(value)):
+        return None
+    unit = entry.get("unit")
+    if unit and isinstance(value, (int, float, str)) and str(unit).lower() not in str(value).lower():
+        return f"{value} {unit}"
+    return value
+
+
+def _values_conflict(values: List[Any]) -> bool:
+    """True when raw values disagree beyond formatting (different numbers in the same unit, or different text)."""
+    distinct = list(dict.fromkeys(clean_value(str(v)) for v in values if v is not None and not is_invalid(str(v))))
+    for i, first in enumerate(distinct):
+        for second in distinct[i + 1:]:
+            n1, u1 = extract_number_and_unit(first)
+            n2, u2 = extract_number_and_unit(second)
+            if n1 is not None and n2 is not None:
+                if (u1 == u2 or not u1 or not u2) and abs(n1 - n2) > 0.05 * max(abs(n1), abs(n2)):
+                    return True
+            elif not values_are_similar(first, second, threshold=0.8):
+                return True
+    return False
+
+
+def attribute_confidence(support: List[Dict]) -> float:
+    """Noisy-or of the confidences of the sources that reported the attribute."""
+    confidences = [
+        SOURCE_CONFIDENCE.get(SOURCE_CONFIDENCE_KEYS.get(s.get("source"), "web"), SOURCE_CONFIDENCE["web"])
+        for s in support
+    ] or [SOURCE_CONFIDENCE["web"]]
+    missing = 1.0
+    for confidence in confidences:
+        missing *= 1.0 - confidence
+    return min(round(1.0 - missing, 3), 0.99)
+
+
+def _assemble_golden_record(
+    standardized_data: Dict, identifiers: Dict, provenance: Optional[Dict[str, List[Dict]]] = None
+) -> Dict:
+    provenance = provenance or {}
+    attributes, confidences, flags = {}, {}, []
+    source_urls = []
+    for name, entry in standardized_data.items():
+        value = _golden_value(entry)
+        if value is None:
+            flags.append(f"no_value:{name}")
+            continue
+        support = provenance.get(name, [])
+        confidence = attribute_confidence(support)
+        raw_values = entry.get("derived_from", []) if isinstance(entry, dict) else []
+        if _values_conflict(raw_values if isinstance(raw_values, list) else []):
+            flags.append(f"conflict:{name}")
+            confidence = round(confidence * 0.8, 3)
+        if confidence < settings.golden_record_min_attribute_confidence:
+            flags.append(f"low_confidence:{name}")
+        attributes[name] = value
+        confidences[name] = confidence
+        for s in support:
+            if s.get("source_url") and s["source_url"] not in source_urls:
+                source_urls.append(s["source_url"])
+
+    brand = identifiers.get("brand") or attributes.get("brand") or ""
+    if not brand:
+        flags.append("missing_brand")
+    min_specs = settings.golden_record_min_specs
+    completeness = min(len(attributes) / min_specs, 1.0) if min_specs else 1.0
+    mean_confidence = sum(confidences.values()) / len(confidences) if confidences else 0.0
+
+    record = {
+        "sku": identifiers.get("mpn", "UNKNOWN"),
+        "brand": brand or "UNKNOWN",
+        "attributes": attributes,
+        "ready_for_publish": bool(brand) and len(attributes) >= min_specs,
+        "confidence": round(mean_confidence * completeness, 3),
+        "attribute_confidence": confidences,
+        "sources": source_urls,
+        "review_flags": flags,
+        "generated_by": "deterministic",
+    }
+    logger.info(
+        f"✓ Golden record for {record['sku']}: "
+        f"{len(attributes)} attrs, "
+        f"ready={record['ready_for_publish']}, flags={len(flags)}"
+    )
+    return record
+
+
+def _needs_review(record: Dict) -> bool:
+    return settings.golden_record_llm_review and any(
+        flag.startswith(("conflict:", "low_confidence:")) for flag in record["review_flags"]
+    )
+
+
+def _golden_review_request(record: Dict, standardized_data: Dict, provenance: Optional[Dict[str, List[Dict]]]):
+    flagged = sorted({f.split(":", 1)[1] for f in record["review_flags"] if f.startswith(("conflict:", "low_confidence:"))})
+    evidence = {
+        name: {
+            "current_value": record["attributes"].get(name),
+            "raw_values": (
+                standardized_data[name].get("derived_from", []) if isinstance(standardized_data.get(name), dict) else []
+            ),
+            "sources": [s.get("source") for s in (provenance or {}).get(name, [])],
+        }
+        for name in flagged
+    }
+    prompt = f"""
+Review these product attributes whose source values disagree or are weakly supported.
+Product: {record['sku']} ({record['brand']})
+Flagged attributes:
+{json.dumps(evidence, indent=2, ensure_ascii=False)}
 
-CRITICAL: The response must be valid JSON only. Do not add "identifiers" or "standardized_attributes" as keys.
+Rules:
+- Pick the correct value for each attribute using ONLY the raw values given; never invent values
+- Use null when no raw value can be trusted
+- Set publishable=false only if a flagged attribute makes the product record unsafe to publish
+
+Output ONLY JSON: {{"attributes": {{"attribute_name": "value or null"}}, "publishable": true}}
 """
-    
     schema = {
-        'type': 'object',
-        'properties': {
-            'sku': {'type': 'string'},
-            'brand': {'type': 'string'},
-            'attributes': {'type': 'object'},
-            'ready_for_publish': {'type': 'boolean'},
-            'confidence': {'type': 'number', 'minimum': 0, 'maximum': 1}
+        "type": "object",
+        "properties": {
+            "attributes": {"type": "object"},
+            "publishable": {"type": "boolean"}
         },
-        'required': ['sku', 'brand', 'attributes', 'ready_for_publish'],
-        'additionalProperties': False
+        "required": ["attributes"]
     }
-    
-    try:
-        result = safe_call_llm(prompt, schema, 'build_golden_record')
-        
-        # Validate result
-        if not result or 'error' in result:
-            raise ValueError(f"LLM returned error: {result.get('error', 'unknown')}")
-        
-        # Check for required fields
-        missing = [f for f in ['sku', 'brand', 'attributes', 'ready_for_publish'] 
-                   if f not in result]
-        if missing:
-            raise ValueError(f"Missing required fields: {missing}")
-        
-        # Check attributes not empty
-        if not result.get('attributes'):
-            raise ValueError("Empty attributes")
-        
-        # Check for wrong structure (nested keys)
-        if any(k in result for k in ['identifiers', 'standardized_attributes', 'product_attributes']):
-            raise ValueError("LLM returned nested structure")
-        
-        logger.info(
-            f"✓ Golden record for {result['sku']}: "
-            f"{len(result['attributes'])} attrs, "
-            f"ready={result['ready_for_publish']}"
-        )
-        
-        return result
-        
-    except Exception as e:
-        logger.warning(
-            f"Golden record LLM failed for {identifiers.get('mpn')}: {e}, "
-            f"using deterministic fallback"
-        )
-        
-        # Deterministic fallback
-        return {
-            'sku': identifiers.get('mpn', 'UNKNOWN'),
-            'brand': identifiers.get('brand', 'UNKNOWN'),
-            'attributes': standardized_data,
-            'ready_for_publish': has_brand and tech_spec_count >= 4,
-            'confidence': 0.7 if tech_spec_count >= 5 else 0.5,
-            'generated_by': 'deterministic_fallback',
-            'reason': str(e)
-        }
\ No newline at end of file
+    return prompt, schema, flagged
+
+
+def _apply_review(record: Dict, review: Dict, flagged: List[str]) -> Dict:
+    if not isinstance(review, dict) or "error" in review or not isinstance(review.get("attributes"), dict):
+        logger.warning(f"Golden record review failed for {record['sku']}, keeping deterministic record")
+        return record
+    for name in flagged:
+        if name not in review["attributes"]:
+            continue
+        value = review["attributes"][name]
+        if value is None or is_invalid(str(value)):
+            record["attributes"].pop(name, None)
+            record["attribute_confidence"].pop(name, None)
+        else:
+            record["attributes"][name] = value
+    record["ready_for_publish"] = (
+        record["ready_for_publish"]
+        and review.get("publishable", True) is not False
+        and len(record["attributes"]) >= settings.golden_record_min_specs
+    )
+    record["generated_by"] = "deterministic+llm_review"
+    return record
+
+
+def build_golden_record(
+    standardized_data: Dict, identifiers: Dict, provenance: Optional[Dict[str, List[Dict]]] = None
+) -> Dict:
+    """Build final golden record from standardized data.
+
+    ``provenance`` maps each attribute to the sources (``source_url``, ``source``)
+    it was extracted from and drives the confidence scores.
+    """
+    early = _golden_record_precheck(standardized_data, identifiers)
+    if early:
+        return early
+
+    record = _assemble_golden_record(standardized_data, identifiers, provenance)
+    if _needs_review(record):
+        prompt, schema, flagged = _golden_review_request(record, standardized_data, provenance)
+        record = _apply_review(record, safe_call_llm(prompt, schema, "review_golden_record"), flagged)
+    return record
+
+
+async def build_golden_record_async(
+    standardized_data: Dict, identifiers: Dict, provenance: Optional[Dict[str, List[Dict]]] = None
+) -> Dict:
+    early = _golden_record_precheck(standardized_data, identifiers)
+    if early:
+        return early
+
+    record = _assemble_golden_record(standardized_data, identifiers, provenance)
+    if _needs_review(record):
+        prompt, schema, flagged = _golden_review_request(record, standardized_data, provenance)
+        record = _apply_review(record, await safe_call_llm_async(prompt, schema, "review_golden_record"), flagged)
+    return record
@@ -1,28 +1,34 @@
-from concurrent.futures import ProcessPoolExecutor, TimeoutError
 import logging
+from app.core.config import settings
+from app.metrics import ingest
+from app.worker_pool import get_worker_pool
 
 logger = logging.getLogger("truth_engine")
 
 
-def _run_pipeline(mpn, upc, title):
+def _run_pipeline(mpn, upc, title, category):
     from .aggregation import aggregate_product
-    return aggregate_product(mpn=mpn, upc=upc, title=title)
+    return aggregate_product(mpn=mpn, upc=upc, title=title, category=category)
 
 
 def aggregate_product_safe(
     mpn: str = None,
     upc: str = None,
     title: str = None,
+    category: str = None,
 ) -> dict:
     logger.info(f"SAFE aggregation started for {mpn or title}")
 
     try:
-        with ProcessPoolExecutor(max_workers=5) as executor:
-            future = executor.submit(_run_pipeline, mpn, upc, title)
-            return future.result(timeout=600)
+        result = get_worker_pool().submit(
+            _run_pipeline, mpn, upc, title, category, timeout=settings.worker_task_timeout_seconds
+        )
+        # The pipeline ran in a worker process; fold its metrics into this one's histograms.
+        ingest(result.get("metrics"))
+        return result
 
     except TimeoutError:
-        logger.error("Pipeline exceeded 60 seconds — killed")
+        logger.error(f"Pipeline exceeded {settings.worker_task_timeout_seconds} seconds — killed")
         return {
             "status": "timeout",
             "ready_for_publish": False,
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into one upstream execution.
+
+    Callers that arrive while a call for the same key is in flight wait for it
+    and receive the same result (or exception) instead of issuing their own.
+    Sync callers are coalesced across threads, async callers per event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._tasks: Dict[Tuple[int, str], asyncio.Task] = {}
+        self.executed = 0
+        self.deduplicated = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.deduplicated += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._tasks.get(loop_key)
+            if task is None:
+                task = asyncio.ensure_future(fn())
+                self._tasks[loop_key] = task
+                task.add_done_callback(lambda _: self._forget(loop_key))
+                self.executed += 1
+            else:
+                self.deduplicated += 1
+        # Shield so one cancelled caller does not cancel the call for everyone else.
+        return await asyncio.shield(task)
+
+    def _forget(self, loop_key):
+        with self._lock:
+            self._tasks.pop(loop_key, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            in_flight = len(self._calls) + len(self._tasks)
+        return {"executed": self.executed, "deduplicated": self.deduplicated, "in_flight": in_flight}
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.sacred import attribute_confidence
+from app.utils import is_invalid, normalize_attribute_key
+
+logger = logging.getLogger("aggregation_engine")
+
+
+def coverage_target(category: Optional[str]) -> int:
+    """Number of distinct attributes a product of ``category`` is expected to have."""
+    targets = {k.strip().lower(): v for k, v in settings.category_coverage_targets.items()}
+    return targets.get((category or "").strip().lower(), settings.coverage_target_attributes)
+
+
+class CoverageTracker:
+    """Distinct attributes found so far, and how well-supported they are, against a target."""
+
+    def __init__(self, target: int, min_confidence: float):
+        self.target = max(target, 1)
+        self.min_confidence = min_confidence
+        self.support: Dict[str, List[Dict]] = {}
+        self.sources = 0
+
+    def add(self, extraction: Dict):
+        self.sources += 1
+        for key, value in (extraction.get("attributes") or {}).items():
+            if value is None or is_invalid(str(value)):
+                continue
+            self.support.setdefault(normalize_attribute_key(key), []).append(
+                {"source": extraction.get("source", "web")}
+            )
+
+    @property
+    def coverage(self) -> float:
+        return min(len(self.support) / self.target, 1.0)
+
+    @property
+    def confidence(self) -> float:
+        if not self.support:
+            return 0.0
+        return sum(attribute_confidence(s) for s in self.support.values()) / len(self.support)
+
+    def satisfied(self) -> bool:
+        return self.coverage >= 1.0 and self.confidence >= self.min_confidence
+
+    def summary(self) -> Dict:
+        return {
+            "target": self.target,
+            "attributes": len(self.support),
+            "coverage": round(self.coverage, 3),
+            "confidence": round(self.confidence, 3),
+            "satisfied": self.satisfied(),
+            "sources_extracted": self.sources,
+        }
+
+
+async def schedule_sources(
+    candidates: List[str],
+    acquire: Callable[[str], Awaitable[Optional[Dict]]],
+    extract: Callable[[Dict], Awaitable[Optional[Dict]]],
+    tracker: CoverageTracker,
+    min_sources: int,
+    max_sources: int,
+    fetch_concurrency: int,
+    extract_concurrency: int,
+) -> List[Tuple[Dict, Dict]]:
+    """Acquire and extract candidates in rank order until the tracker is satisfied.
+
+    Fetches run ahead of extraction by at most ``fetch_concurrency`` sources.
+    After each extraction the tracker is checked; once it is satisfied (and
+    ``min_sources`` are in) or ``max_sources`` have been extracted, the
+    remaining fetches and extractions are cancelled. Returns
+    ``(source, extraction)`` pairs in completion order.
+    """
+    pending = list(candidates)
+    ready: List[Dict] = []
+    fetching: Dict[asyncio.Future, str] = {}
+    extracting: Dict[asyncio.Future, Dict] = {}
+    results: List[Tuple[Dict, Dict]] = []
+
+    def done() -> bool:
+        if len(results) >= max_sources:
+            return True
+        return len(results) >= min_sources and tracker.satisfied()
+
+    try:
+        while not done():
+            # Extraction is the expensive step: never have more in flight than could still be needed.
+            while ready and len(extracting) < extract_concurrency and len(results) + len(extracting) < max_sources:
+                src = ready.pop(0)
+                extracting[asyncio.ensure_future(extract(src))] = src
+            while pending and len(fetching) + len(ready) < fetch_concurrency:
+                url = pending.pop(0)
+                fetching[asyncio.ensure_future(acquire(url))] = url
+            if not fetching and not extracting:
+                break
+            finished, _ = await asyncio.wait(set(fetching) | set(extracting), return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                if task in fetching:
+                    url = fetching.pop(task)
+                    try:
+                        src = task.result()
+                    except Exception as e:
+                        logger.warning(f"Source acquisition failed for {url}: {e}")
+                        continue
+                    if src:
+                        ready.append(src)
+                else:
+                    src = extracting.pop(task)
+                    try:
+                        data = task.result()
+                    except Exception as e:
+                        logger.warning(f"Extraction failed for {src['source_url']}: {e}")
+                        continue
+                    if data is not None:
+                        tracker.add(data)
+                        results.append((src, data))
+    finally:
+        for task in list(fetching) + list(extracting):
+            task.cancel()
+    if pending or fetching or extracting or ready:
+        logger.info(
+            f"Source scheduler stopped after {len(results)} sources "
+            f"({len(pending) + len(fetching) + len(ready) + len(extracting)} skipped): {tracker.summary()}"
+        )
+    return results
@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.disk_cache import DiskCache
+
+logger = logging.getLogger("aggregation_engine")
+
+
+# Leading bytes of formats that never carry a spec sheet we can extract.
+NON_SPEC_MAGIC = (
+    b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"RIFF", b"PK\x03\x04", b"\x1f\x8b", b"ID3", b"OggS", b"wOFF", b"wOF2",
+)
+NON_SPEC_CONTENT_TYPES = ("image/", "video/", "audio/", "font/", "application/zip", "application/json")
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
+def rejects_content_type(content_type: str) -> bool:
+    return (content_type or "").lower().startswith(NON_SPEC_CONTENT_TYPES)
+
+
+def sniff_kind(head: bytes, content_type: str = "") -> Optional[str]:
+    """"pdf" or "html" from the first bytes of a body (Content-Type only breaks ties); None if neither."""
+    if b"%PDF-" in head[:1024]:
+        return "pdf"
+    if head.startswith(NON_SPEC_MAGIC) or head[4:8] == b"ftyp":
+        return None
+    start = head[:1024].lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if start.startswith((b"<!doctype html", b"<html", b"<?xml", b"<head", b"<!--")) or b"<html" in start or b"<body" in start:
+        return "html"
+    content_type = (content_type or "").lower()
+    if "pdf" in content_type:
+        return "pdf"
+    if "html" in content_type or content_type.startswith("text/"):
+        return "html"
+    return None
+
+
+class SourceStore:
+    """Persistent copy of every downloaded source.
+
+    Bodies are content-addressed files (``<root>/<sha256[:16]>``, the layout
+    of the existing storage/ corpus). A URL index keeps the hash, content
+    type and ETag/Last-Modified of the last response, so a repeat fetch can
+    be a conditional GET and an unchanged body is neither transferred nor
+    uploaded again.
+    """
+
+    def __init__(self, root: str, index_path: str, max_entries: int = 100000):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index = DiskCache(index_path, max_entries=max_entries)
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest
+
+    def put(self, content: bytes) -> str:
+        tmp = self.incoming()
+        tmp.write_bytes(content)
+        return self.commit(tmp, content_hash(content))
+
+    def put_file(self, source: Path) -> str:
+        digest = hashlib.sha256()
+        tmp = self.incoming()
+        with open(source, "rb") as src, open(tmp, "wb") as dst:
+            for chunk in iter(lambda: src.read(1 << 20), b""):
+                digest.update(chunk)
+                dst.write(chunk)
+        return self.commit(tmp, digest.hexdigest()[:16])
+
+    def incoming(self) -> Path:
+        """Fresh temporary file in the store directory, to be passed to commit() or discarded."""
+        fd, name = tempfile.mkstemp(prefix=".incoming-", suffix=".tmp", dir=self.root)
+        os.close(fd)
+        return Path(name)
+
+    def commit(self, tmp: Path, digest: str) -> str:
+        path = self.path(digest)
+        if path.exists():
+            tmp.unlink(missing_ok=True)
+        else:
+            os.replace(tmp, path)
+        return digest
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """Index entry for ``url``, provided its body is still on disk."""
+        entry = self.index.get(url)
+        if entry and self.path(entry["hash"]).exists():
+            return entry
+        return None
+
+    def save(self, url: str, entry: Dict):
+        """Record a validated response: hash, type, etag, last_modified (archive URLs live in the archival queue)."""
+        self.index.set(url, {**entry, "fetched_at": time.time()})
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict]) -> Dict[str, str]:
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    @staticmethod
+    def is_fresh(entry: Dict) -> bool:
+        return time.time() - entry.get("fetched_at", 0) < settings.source_store_revalidate_seconds
+
+    def stats(self) -> Dict:
+        return {"root": str(self.root), **self.index.stats()}
+
+
+source_store = SourceStore(
+    settings.source_store_path,
+    settings.source_store_index_path,
+    max_entries=settings.source_store_max_entries,
+)
@@ -1,4 +1,5 @@
 import re
+from typing import Dict, List, Iterable, Optional, Tuple
 INVALID_VALUES = {"n/a", "-", "unknown", "none", "", "not specified", "tbd"}
 def is_invalid(value:str)->bool:
     return value.strip().lower() in INVALID_VALUES or value.strip()==''
@@ -6,4 +7,52 @@ def normalize_text(value:str)->str:
     return re.sub(r"\s+", " ", value.strip())
 def extract_number(value: str):
     match = re.search(r"(\d+(\.\d+)?)", value)
-    return float(match.group(1)) if match else None
\ No newline at end of file
+    return float(match.group(1)) if match else None
+UNIT_HINTS = (
+    r"lbs?|pounds?|kg|kgs|g|grams?|oz|ounces?|in|inch|inches|ft|feet|mm|cm|m|meters?|"
+    r"v|volts?|w|watts?|a|amps?|mah|ah|wh|hz|khz|mhz|ghz|db|psi|bar|rpm|l|ml|gal|%|"
+    r"°\s*[cf]|deg\s*[cf]"
+)
+UNIT_ALIASES = {
+    "lbs": "lb", "pound": "lb", "pounds": "lb", "kgs": "kg", "gram": "g", "grams": "g", "ounce": "oz",
+    "ounces": "oz", "inch": "in", "inches": "in", "feet": "ft", "meter": "m", "meters": "m", "volt": "v",
+    "volts": "v", "watt": "w", "watts": "w", "amp": "a", "amps": "a",
+}
+_UNIT_SUFFIX = re.compile(rf"(?:\s*[\(\[]\s*({UNIT_HINTS})\s*[\)\]]|\s*,\s*({UNIT_HINTS}))\s*$")
+def _canonical_unit(unit:str)->str:
+    unit = re.sub(r"\s+", "", unit)
+    if unit.startswith(("°", "deg")):
+        return "deg" + unit[-1]
+    return UNIT_ALIASES.get(unit, unit)
+def attribute_key_parts(key:str)->Tuple[str, Optional[str]]:
+    """Normalized name and canonical unit hint of an attribute name ("WEIGHT (lbs):" -> ("weight", "lb"))."""
+    key = str(key).strip().lower().rstrip(":").strip()
+    unit = None
+    match = _UNIT_SUFFIX.search(key)
+    if match and key[:match.start()].strip():
+        unit = _canonical_unit(match.group(1) or match.group(2))
+        key = key[:match.start()]
+    return re.sub(r"[^0-9a-z%]+", " ", key).strip() or key, unit
+def normalize_attribute_key(key:str)->str:
+    """Case- and punctuation-insensitive form of an attribute name ("WEIGHT (lbs):" -> "weight lb").
+
+    The unit hint stays part of the key, in canonical spelling, so "Input (V)"
+    and "Input (A)" never merge while "Weight (lbs)" and "weight, lb" do.
+    """
+    name, unit = attribute_key_parts(key)
+    return f"{name} {unit}" if unit else name
+def coerce_confidence(value, default:float=0.5)->float:
+    """LLM-reported confidence as a float in [0, 1]; missing or non-numeric values ("high") become ``default``."""
+    try:
+        confidence = float(value)
+    except (TypeError, ValueError):
+        return default
+    return default if confidence != confidence else min(max(confidence, 0.0), 1.0)
+def group_attribute_keys(keys:Iterable[str])->Dict[str, List[str]]:
+    """Group raw keys by normalize_attribute_key, keeping first-seen order; the map doubles as the reverse lookup."""
+    groups: Dict[str, List[str]] = {}
+    for key in keys:
+        variants = groups.setdefault(normalize_attribute_key(key), [])
+        if key not in variants:
+            variants.append(key)
+    return groups
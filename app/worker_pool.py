@@ -0,0 +1,196 @@
+import importlib
+import logging
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger("truth_engine")
+
+# Imported by every worker before it reports ready: the pipeline and, through it,
+# pandas, cv2, fitz, playwright and the OpenAI / Gemini clients.
+WARM_MODULES = ("app.aggregation",)
+
+
+class WorkerError(RuntimeError):
+    """The task raised in the worker; the message carries the original exception."""
+
+
+def _warm():
+    for name in WARM_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logger.warning(f"Worker {os.getpid()} could not pre-import {name}: {e}")
+    from app.async_runtime import get_loop
+    get_loop()
+
+
+def _worker_main(conn):
+    _warm()
+    conn.send(("ready", os.getpid()))
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+        fn, args, kwargs = task
+        try:
+            result = ("ok", fn(*args, **kwargs))
+        except Exception as e:
+            result = ("error", f"{type(e).__name__}: {e}")
+        conn.send(result)
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.ready = False
+        self.tasks = 0
+
+    def wait_ready(self, timeout: float) -> bool:
+        if not self.ready and self.conn.poll(timeout):
+            self.ready = self.conn.recv()[0] == "ready"
+        return self.ready
+
+    def stop(self, kill: bool = False):
+        if not kill:
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(5)
+        self.conn.close()
+
+
+class WorkerPool:
+    """Long-lived, pre-warmed worker processes for running the pipeline in isolation.
+
+    Workers are spawned once and import the pipeline up front, so a task
+    only pays for pickling its arguments and result. A task that overruns
+    its timeout gets its worker killed and replaced, and the other workers
+    are untouched. Each worker is also replaced after ``max_tasks`` tasks.
+    """
+
+    def __init__(self, size: int, max_tasks: int, startup_timeout: float):
+        self.size = size
+        self.max_tasks = max_tasks
+        self.startup_timeout = startup_timeout
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.counts = {"tasks": 0, "errors": 0, "timeouts": 0, "crashes": 0, "recycled": 0, "spawned": 0}
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _Worker:
+        with self._lock:
+            self.counts["spawned"] += 1
+        return _Worker(self._ctx)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _replace(self, worker: _Worker, kill: bool):
+        # Stopping can block for seconds; the replacement is queued straight away.
+        threading.Thread(target=worker.stop, args=(kill,), daemon=True).start()
+        if not self._closed:
+            self._idle.put(self._spawn())
+
+    def submit(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run ``fn(*args, **kwargs)`` in a worker and return its result.
+
+        Raises TimeoutError if it runs longer than ``timeout`` seconds (the
+        wait for a free worker is not counted) and WorkerError if it raised.
+        """
+        if self._closed:
+            raise RuntimeError("worker pool is closed")
+        worker = self._idle.get()
+        try:
+            if not worker.wait_ready(self.startup_timeout):
+                raise EOFError("worker did not start")
+            try:
+                worker.conn.send((fn, args, kwargs))
+            except (pickle.PicklingError, TypeError, AttributeError):
+                # Nothing reached the worker; it is still good.
+                self._idle.put(worker)
+                raise
+            finished = worker.conn.poll(timeout)
+            if finished:
+                status, payload = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            self._count("crashes")
+            logger.error(f"Worker {worker.process.pid} died ({e}), replacing it")
+            self._replace(worker, kill=True)
+            raise WorkerError(f"worker process died: {e}")
+        if not finished:
+            self._count("timeouts")
+            logger.error(f"Worker {worker.process.pid} exceeded {timeout}s, replacing it")
+            self._replace(worker, kill=True)
+            raise TimeoutError(f"task exceeded {timeout}s")
+        worker.tasks += 1
+        self._count("tasks")
+        if self.max_tasks and worker.tasks >= self.max_tasks:
+            self._count("recycled")
+            self._replace(worker, kill=False)
+        else:
+            self._idle.put(worker)
+        if status == "error":
+            self._count("errors")
+            raise WorkerError(payload)
+        return payload
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self.counts)
+        return {"size": self.size, "idle": self._idle.qsize(), "max_tasks": self.max_tasks, **counts}
+
+
+_pool: Optional[WorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool() -> WorkerPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            started = time.monotonic()
+            _pool = WorkerPool(
+                size=settings.worker_pool_size,
+                max_tasks=settings.worker_max_tasks,
+                startup_timeout=settings.worker_startup_timeout_seconds,
+            )
+            logger.info(f"Worker pool: spawned {_pool.size} workers in {time.monotonic() - started:.2f}s")
+        return _pool
+
+
+def shutdown_worker_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
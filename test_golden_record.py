@@ -0,0 +1,35 @@
+from app.sacred import _golden_review_request, build_golden_record
+
+# Shaped like standardize_batch_with_llm output and the provenance built in _aggregate.
+STANDARDIZED = {
+    "weight": {"standard_value": 5, "unit": "lb", "derived_from": ["5 lb", "5 lbs"]},
+    "length": {"standard_value": 10, "unit": "in", "derived_from": ["10 in", "14 in"]},
+    "color": "Blue",
+    "voltage": {"error": "standardization_failed"},
+}
+IDENTIFIERS = {"mpn": "X-100", "upc": "", "title": "Acme Pump", "brand": "Acme"}
+PROVENANCE = {
+    "weight": [{"source_url": "https://a.example/x.pdf", "source": "pdf"}, {"source_url": "https://b.example/x", "source": "web"}],
+    "length": [{"source_url": "https://b.example/x", "source": "web"}],
+    "color": [{"source_url": "https://b.example/x", "source": "web"}],
+}
+
+
+def test_build_golden_record():
+    record = build_golden_record(STANDARDIZED, IDENTIFIERS, PROVENANCE)
+    assert record["attributes"]["weight"] == "5 lb"
+    assert record["attributes"]["color"] == "Blue"
+    assert "voltage" not in record["attributes"]
+    assert "conflict:length" in record["review_flags"]
+    assert set(record["attribute_confidence"]) == set(record["attributes"])
+    assert record["sources"] == ["https://a.example/x.pdf", "https://b.example/x"]
+
+    # The LLM review prompt must cope with non-dict entries too.
+    record["review_flags"].append("low_confidence:color")
+    _, _, flagged = _golden_review_request(record, STANDARDIZED, PROVENANCE)
+    assert flagged == ["color", "length"]
+
+
+if __name__ == "__main__":
+    test_build_golden_record()
+    print("✅ build_golden_record smoke test passed")